@@ -0,0 +1,123 @@
+""" Benchmarks of the server.
+"""
+import json
+import logging
+import socket
+import time
+from socketserver import ThreadingTCPServer
+from threading import Thread
+
+from invoke import task
+
+from config import CONFIG
+from defs import Action, Result
+from entity.game import Game
+from logger import log
+from profiler import percentile
+from server import GameServerRequestHandler
+
+
+class BenchmarkClient(object):
+    """ Minimal blocking client of the game server.
+    """
+
+    def __init__(self, address):
+        self.sock = socket.create_connection(address)
+
+    def receive(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError('Connection closed by the server')
+            data += chunk
+        return data
+
+    def send_action(self, action, data=None):
+        """ Sends the command, returns response's result and message.
+        """
+        message = json.dumps(data or {}).encode('utf-8')
+        self.sock.sendall(b''.join((
+            action.to_bytes(CONFIG.ACTION_HEADER, byteorder='little'),
+            len(message).to_bytes(CONFIG.MSGLEN_HEADER, byteorder='little'),
+            message,
+        )))
+        result = Result(int.from_bytes(self.receive(CONFIG.RESULT_HEADER), byteorder='little'))
+        message_len = int.from_bytes(self.receive(CONFIG.MSGLEN_HEADER), byteorder='little')
+        return result, self.receive(message_len).decode('utf-8')
+
+    def do_action(self, action, data=None):
+        result, message = self.send_action(action, data)
+        if result != Result.OKEY:
+            raise RuntimeError('Unexpected result of {}: {}, message: {}'.format(action.name, result.name, message))
+        return json.loads(message) if message else None
+
+    def close(self):
+        self.sock.close()
+
+
+def durations_stats(durations):
+    """ Returns mean and percentiles of durations (in seconds) formatted in microseconds.
+    """
+    durations = sorted(durations)
+    return 'mean: {:.0f}us, p50: {:.0f}us, p99: {:.0f}us'.format(
+        sum(durations) / len(durations) * 1e6, percentile(durations, 50) * 1e6, percentile(durations, 99) * 1e6
+    )
+
+
+def benchmark_level(address, level, requests, turns):
+    """ Plays a game with the server's logger at the level, returns durations of MAP layer 1 requests,
+    TURN requests and ticks (measured by the game).
+    """
+    log.setLevel(level)
+    client = BenchmarkClient(address)
+    try:
+        game_name = 'Logging benchmark {}'.format(level)
+        player = client.do_action(Action.LOGIN, {'name': game_name, 'game': game_name})
+        for train in player['trains']:
+            client.do_action(Action.MOVE, {'train_idx': train['idx'], 'speed': 1, 'line_idx': train['line_idx']})
+
+        requests_durations = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            client.do_action(Action.MAP, {'layer': 1})
+            requests_durations.append(time.perf_counter() - start)
+
+        turns_durations, ticks_durations = [], []
+        game = Game.GAMES[game_name]
+        for _ in range(turns):
+            start = time.perf_counter()
+            client.do_action(Action.TURN)
+            turns_durations.append(time.perf_counter() - start)
+            ticks_durations.append(game.tick_duration)
+
+        client.do_action(Action.LOGOUT)
+    finally:
+        client.close()
+    return requests_durations, turns_durations, ticks_durations
+
+
+@task
+def benchmark_logging(_, requests=2000, turns=200, levels='WARNING,INFO'):
+    """ Measures cost of requests and ticks at different levels of the server's logger.
+    Runs the server in-process on the active map (use 'generate-map' first), plays a game for each level:
+    MAP layer 1 requests, then TURN requests. Reports durations of requests and ticks for each level.
+    """
+    server = ThreadingTCPServer(('127.0.0.1', 0), GameServerRequestHandler)
+    Thread(target=server.serve_forever, name='benchmark-server', daemon=True).start()
+    results = []
+    try:
+        for level in levels.split(','):
+            results.append((level, ) + benchmark_level(server.server_address, level, requests, turns))
+    finally:
+        server.shutdown()
+        server.server_close()
+        Game.stop_all_games()
+
+    log.setLevel(logging.WARNING)
+    for level, requests_durations, turns_durations, ticks_durations in results:
+        log.warning('Level: %s, MAP layer 1: %s', level, durations_stats(requests_durations))
+        log.warning('Level: %s, TURN: %s', level, durations_stats(turns_durations))
+        log.warning('Level: %s, tick: %s', level, durations_stats(ticks_durations))
+    if log.is_queued:
+        log.stop()
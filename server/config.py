@@ -18,6 +18,7 @@ class TestingConfig(Config):
     TRAIN_ALWAYS_DEVASTATED = False  # There is at least one test which awaits non-devastated train, TODO: check it
     MAX_LINE_LENGTH = 1000
     FUEL_ENABLED = True
+    ADMIN_ADDRS = {'127.0.0.1'}
 
 
 class TestingConfigWithEvents(TestingConfig):
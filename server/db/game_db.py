@@ -1,12 +1,12 @@
 """ Contains DB helpers for game actions.
 """
 
-from sqlalchemy import func, and_
+from sqlalchemy import and_, case, func, select, tuple_
 
 from config import CONFIG
 from db.models import Base, Game, Action, Player
 from db.session import session_wrapper
-from defs import Action as ActionCodes
+from defs import Action as ActionCodes, GameState
 
 
 def reset_db():
@@ -28,13 +28,13 @@ def truncate_tables(session=None):
 @session_wrapper
 def add_game(
         name, map_idx, session=None,
-        num_players=CONFIG.DEFAULT_NUM_PLAYERS, num_turns=CONFIG.DEFAULT_NUM_TURNS
+        num_players=CONFIG.DEFAULT_NUM_PLAYERS, num_turns=CONFIG.DEFAULT_NUM_TURNS, seed=None
 ):
     """ Creates a new Game in DB.
     """
-    new_game = Game(name=name, map_id=map_idx, num_players=num_players, num_turns=num_turns)
+    new_game = Game(name=name, map_id=map_idx, num_players=num_players, num_turns=num_turns, seed=seed)
     session.add(new_game)
-    session.commit()  # Commit to get game's id.
+    session.flush()  # Flush to get game's id.
     return new_game.id
 
 
@@ -47,6 +47,23 @@ def add_action(game_idx, action, message=None, player_idx=None, session=None):
     session.add(new_action)
 
 
+def turns_count():
+    """ Returns subquery which counts TURN actions of the game, correlated with the enclosing query of games.
+    """
+    return select([
+        func.count(Action.id)
+    ]).where(
+        and_(Action.game_id == Game.id, Action.code == ActionCodes.TURN.value)
+    ).as_scalar()
+
+
+def game_length():
+    """ Returns expression of the game's length. Length of finished games is stored in games table,
+    length of running games is counted from their TURN actions.
+    """
+    return case([(Game.state == GameState.FINISHED.value, Game.num_ticks)], else_=turns_count())
+
+
 @session_wrapper
 def add_player(idx, name, password=None, session=None):
     """ Creates a new Player in DB.
@@ -72,37 +89,66 @@ def get_all_games(session=None):
     """
     return session.query(
         Game,
-        func.count(Action.id),
-    ).outerjoin(
-        Action,
-        and_(
-            Game.id == Action.game_id,
-            Action.code == ActionCodes.TURN.value,
-        )
-    ).group_by(
-        Game.id
+        game_length(),
     ).order_by(
         Game.id
     ).all()
 
 
+@session_wrapper
+def get_games(limit=None, cursor=None, map_idx=None, created_from=None, created_to=None, with_data=True,
+              session=None):
+    """ Retrieves page of games with their length, filtered by map and creation time.
+    Uses keyset pagination: cursor is the id of the last game of the previous page.
+    Only listed columns are selected, so without data the query is covered by ix_games_listing index.
+    """
+    columns = [
+        Game.id,
+        Game.name,
+        Game.created_at,
+        Game.map_id,
+        Game.num_players,
+        game_length().label('length'),
+    ]
+    if with_data:
+        columns.append(Game.data)
+    query = session.query(*columns)
+    if cursor is not None:
+        query = query.filter(Game.id > cursor)
+    if map_idx is not None:
+        query = query.filter(Game.map_id == map_idx)
+    if created_from is not None:
+        query = query.filter(Game.created_at >= created_from)
+    if created_to is not None:
+        query = query.filter(Game.created_at < created_to)
+    return query.order_by(
+        Game.id
+    ).limit(
+        limit
+    ).all()
+
+
+@session_wrapper
+def get_games_idx(state=None, session=None):
+    """ Retrieves indexes of all games or games in the specified state.
+    """
+    query = session.query(
+        Game.id
+    )
+    if state is not None:
+        query = query.filter(Game.state == state.value)
+    return [game_idx for game_idx, in query.order_by(Game.id)]
+
+
 @session_wrapper
 def get_game(game_idx, session=None):
     """ Retrieves specified game with it's length.
     """
     return session.query(
         Game,
-        func.count(Action.id),
+        game_length(),
     ).filter(
         Game.id == game_idx
-    ).outerjoin(
-        Action,
-        and_(
-            Game.id == Action.game_id,
-            Action.code == ActionCodes.TURN.value,
-        )
-    ).group_by(
-        Game.id
     ).one_or_none()
 
 
@@ -120,6 +166,30 @@ def get_all_actions(game_idx, session=None):
     ).all()
 
 
+@session_wrapper
+def get_actions(game_idx, after=None, limit=None, session=None):
+    """ Retrieves window of the game's actions in chronological order.
+    Uses keyset pagination: after is the (created_at, id) key of the last action of the previous window.
+    """
+    query = session.query(
+        Action.id,
+        Action.created_at,
+        Action.code,
+        Action.message,
+        Action.player_id,
+    ).filter(
+        Action.game_id == game_idx
+    )
+    if after is not None:
+        query = query.filter(tuple_(Action.created_at, Action.id) > tuple_(*after))
+    return query.order_by(
+        Action.created_at,
+        Action.id,
+    ).limit(
+        limit
+    ).all()
+
+
 @session_wrapper
 def update_game_data(game_idx, data, session=None):
     """ Creates a new Game in DB.
@@ -133,3 +203,19 @@ def update_game_data(game_idx, data, session=None):
         game.data.update(data)
     else:
         game.data = data
+
+
+@session_wrapper
+def update_game_state(game_idx, state, session=None):
+    """ Updates state of the Game in DB. Length of the game is stored when the game is finished.
+    """
+    values = {'state': state.value}
+    if state == GameState.FINISHED:
+        values['num_ticks'] = turns_count()
+    session.query(
+        Game
+    ).filter(
+        Game.id == game_idx
+    ).update(
+        values, synchronize_session=False
+    )
@@ -1,9 +1,12 @@
 """ Contains DB helpers for map actions.
 """
+import hashlib
 import os
+import uuid
 from glob import glob
 
 import yaml
+from sqlalchemy import text
 
 from config import CONFIG
 from db.models import Base, Map, Line, Point, Post
@@ -28,12 +31,12 @@ def truncate_tables(session=None):
 
 
 @session_wrapper
-def add_map(size_x, size_y, name='', session=None):
+def add_map(size_x, size_y, name='', content_hash=None, import_id=None, session=None):
     """ Creates a new Map in DB.
     """
-    new_map = Map(name=name, size_x=size_x, size_y=size_y)
+    new_map = Map(name=name, size_x=size_x, size_y=size_y, content_hash=content_hash, import_id=import_id)
     session.add(new_map)
-    session.commit()  # Commit to get map's id.
+    session.flush()  # Flush to get map's id.
     return new_map.id
 
 
@@ -43,7 +46,7 @@ def add_line(map_id, length, p0, p1, session=None):
     """
     new_line = Line(length=length, p0=p0, p1=p1, map_id=map_id)
     session.add(new_line)
-    session.commit()  # Commit to get line's id.
+    session.flush()  # Flush to get line's id.
     return new_line.id
 
 
@@ -53,7 +56,7 @@ def add_point(map_id, x=0, y=0, session=None):
     """
     new_point = Point(map_id=map_id, x=x, y=y)
     session.add(new_point)
-    session.commit()  # Commit to get point's id.
+    session.flush()  # Flush to get point's id.
     return new_point.id
 
 
@@ -65,7 +68,7 @@ def add_post(map_id, point_id, name, type_p, population=0, armor=0, product=0, r
     new_post = Post(name=name, type=type_p, population=population, armor=armor, product=product,
                     replenishment=replenishment, map_id=map_id, point_id=point_id)
     session.add(new_post)
-    session.commit()  # Commit to get post's id.
+    session.flush()  # Flush to get post's id.
     return new_post.id
 
 
@@ -106,8 +109,98 @@ def set_active_map(map_name, session=None):
 
 
 @session_wrapper
-def generate_maps(map_names=None, active_map=None, session=None):
-    """ Generates a map in DB.
+def reserve_ids(table, count, session=None):
+    """ Reserves a bulk of IDs from the table's ID sequence.
+    """
+    if count == 0:
+        return []
+    rows = session.execute(
+        text('SELECT nextval(:seq_name) FROM generate_series(1, :count)'),
+        {'seq_name': '{}_id_seq'.format(table.name), 'count': count}
+    )
+    return sorted(r[0] for r in rows)
+
+
+@session_wrapper
+def bulk_insert(table, rows, session=None):
+    """ Inserts rows into the table with multi-row INSERT statements.
+    """
+    for i in range(0, len(rows), CONFIG.MAP_IMPORT_BATCH_SIZE):
+        session.execute(table.insert().values(rows[i:i + CONFIG.MAP_IMPORT_BATCH_SIZE]))
+
+
+@session_wrapper
+def import_map(m, content_hash=None, session=None):
+    """ Imports the map (parsed map file) into DB using bulk inserts, returns map's id.
+    """
+    map_id = add_map(
+        name=m['name'], size_x=m['size'][0], size_y=m['size'][1], content_hash=content_hash,
+        import_id=uuid.uuid4().hex, session=session
+    )
+
+    points_idx = reserve_ids(Point.__table__, len(m['points']), session=session)
+    bulk_insert(Point.__table__, [
+        {'id': idx, 'map_id': map_id, 'x': point[0], 'y': point[1]}
+        for idx, point in zip(points_idx, m['points'])
+    ], session=session)
+
+    posts = []
+    for idx, post in zip(reserve_ids(Post.__table__, len(m['posts']), session=session), m['posts']):
+        post = dict(post)
+        posts.append({
+            'id': idx,
+            'map_id': map_id,
+            'point_id': points_idx[post.pop('point') - 1],
+            'name': post.pop('name'),
+            'type': post.pop('type'),
+            'population': post.pop('population', 0),
+            'armor': post.pop('armor', 0),
+            'product': post.pop('product', 0),
+            'replenishment': post.pop('replenishment', 1),
+        })
+    bulk_insert(Post.__table__, posts, session=session)
+
+    bulk_insert(Line.__table__, [
+        {
+            'id': idx, 'map_id': map_id, 'length': line[0],
+            'p0': points_idx[line[1] - 1], 'p1': points_idx[line[2] - 1],
+        }
+        for idx, line in zip(reserve_ids(Line.__table__, len(m['lines']), session=session), m['lines'])
+    ], session=session)
+
+    return map_id
+
+
+@session_wrapper
+def load_map(file_name, force=False, session=None):
+    """ Imports the map file into DB replacing the map with the same name. The map which file content has not been
+    changed since the last import is skipped, set 'force' to re-import it anyway. Returns True if the map is imported.
+    """
+    with open(file_name, 'rb') as f:
+        content = f.read()
+    content_hash = hashlib.sha1(content).hexdigest()
+
+    # Skip the map if it has been imported from the same content, no need to parse it:
+    if not force and session.query(Map.id).filter(Map.content_hash == content_hash).first() is not None:
+        return False
+
+    m = yaml.load(content)
+
+    # Delete the map if it exist
+    session.query(
+        Map
+    ).filter(
+        Map.name == m['name']
+    ).delete()
+
+    import_map(m, content_hash=content_hash, session=session)
+    return True
+
+
+@session_wrapper
+def generate_maps(map_names=None, active_map=None, force=False, session=None):
+    """ Generates a map in DB. Maps which file content has not been changed since the last import are skipped,
+    set 'force' to re-import them anyway.
     """
     maps = discover_maps(CONFIG.MAPS_DISCOVERY)
     maps_to_generate = maps.keys() if map_names is None else map_names
@@ -118,31 +211,10 @@ def generate_maps(map_names=None, active_map=None, session=None):
             log.error(err_msg)
             raise ValueError(err_msg)
 
-        with open(maps[map_name], 'r') as f:
-            m = yaml.load(f)
-
-        # Delete the map if it exist
-        session.query(
-            Map
-        ).filter(
-            Map.name == m['name']
-        ).delete()
-
-        map_id = add_map(name=m['name'], size_x=m['size'][0], size_y=m['size'][1], session=session)
-
-        points_idx = []
-        for point in m['points']:
-            point_idx = add_point(map_id, x=point[0], y=point[1], session=session)
-            points_idx.append(point_idx)
-
-        for post in m['posts']:
-            add_post(map_id, points_idx[post.pop('point') - 1], post.pop('name'), post.pop('type'),
-                     session=session, **post)
-
-        for line in m['lines']:
-            add_line(map_id, line[0], points_idx[line[1] - 1], points_idx[line[2] - 1], session=session)
-
-        log.debug('Map \'{}\' has been generated'.format(map_name))
+        if load_map(maps[map_name], force=force, session=session):
+            log.debug('Map \'{}\' has been generated'.format(map_name))
+        else:
+            log.debug('Map \'{}\' has not been changed, skip it'.format(map_name))
 
     if active_map is not None:
         set_active_map(active_map, session=session)
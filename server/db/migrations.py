@@ -0,0 +1,57 @@
+""" Contains DB schema migrations for already initialized DBs.
+"""
+from db.models import SchemaMigration
+from db.session import session_wrapper
+from defs import Action
+from logger import log
+
+# Named migrations which bring DB created by previous versions to the current schema, each is applied once:
+MIGRATIONS = [
+    ('maps_content_hash', [
+        'ALTER TABLE maps ADD COLUMN IF NOT EXISTS content_hash VARCHAR',
+        'CREATE INDEX IF NOT EXISTS ix_maps_content_hash ON maps (content_hash)',
+    ]),
+    ('games_num_ticks_and_state', [
+        'ALTER TABLE games ADD COLUMN IF NOT EXISTS num_ticks INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE games ADD COLUMN IF NOT EXISTS state INTEGER NOT NULL DEFAULT 1',
+        'CREATE INDEX IF NOT EXISTS ix_games_state ON games (state)',
+        # Backfill games length from TURN actions:
+        'UPDATE games SET num_ticks = turns.count FROM ('
+        '    SELECT game_id, count(id) AS count FROM actions WHERE code = {} GROUP BY game_id'
+        ') AS turns WHERE games.id = turns.game_id'.format(Action.TURN.value),
+        # Backfill games states, game's ratings are saved on finish (GameState.FINISHED = 3, GameState.RUN = 2):
+        'UPDATE games SET state = 3 WHERE data IS NOT NULL',
+        'UPDATE games SET state = 2 WHERE data IS NULL AND num_ticks > 0',
+    ]),
+    ('games_created_at_index', [
+        'CREATE INDEX IF NOT EXISTS ix_games_created_at ON games (created_at)',
+    ]),
+    ('actions_keyset_index', [
+        'CREATE INDEX IF NOT EXISTS ix_actions_game_id_created_at_id ON actions (game_id, created_at, id)',
+    ]),
+    ('games_seed', [
+        'ALTER TABLE games ADD COLUMN IF NOT EXISTS seed INTEGER',
+    ]),
+    ('maps_import_id', [
+        'ALTER TABLE maps ADD COLUMN IF NOT EXISTS import_id VARCHAR',
+    ]),
+    ('games_listing_index', [
+        'CREATE INDEX IF NOT EXISTS ix_games_listing ON games '
+        '(id, name, created_at, map_id, num_players, num_ticks, state)',
+    ]),
+]
+
+
+@session_wrapper
+def apply_migrations(session=None):
+    """ Applies all migrations which have not been applied yet.
+    """
+    SchemaMigration.__table__.create(bind=session.connection(), checkfirst=True)
+    applied = {m.name for m in session.query(SchemaMigration)}
+    for name, statements in MIGRATIONS:
+        if name in applied:
+            continue
+        for statement in statements:
+            session.execute(statement)
+        session.add(SchemaMigration(name=name))
+        log.info('Migration has been applied: {}'.format(name))
@@ -2,7 +2,7 @@
 """
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, JSON
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, JSON, Index
 from sqlalchemy import func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.mutable import MutableDict
@@ -22,6 +22,8 @@ class Map(Base):
     active = Column(Boolean, default=False, index=True, nullable=False)
     size_x = Column(Integer)
     size_y = Column(Integer)
+    content_hash = Column(String, index=True)
+    import_id = Column(String)  # Unique id of the import, ids of map's objects are reassigned on each import.
     lines = relationship('Line', backref='map', lazy='dynamic')
     points = relationship('Point', backref='map', lazy='dynamic')
     posts = relationship('Post', backref='map', lazy='dynamic')
@@ -88,16 +90,23 @@ class Post(Base):
 class Game(Base):
 
     __tablename__ = 'games'
+    __table_args__ = (
+        # Covers listing of games (without data):
+        Index('ix_games_listing', 'id', 'name', 'created_at', 'map_id', 'num_players', 'num_ticks', 'state'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), index=True, nullable=False)
     updated_at = Column(
         DateTime, default=datetime.utcnow, server_default=func.now(), onupdate=datetime.utcnow
     )
     map_id = Column(Integer, ForeignKey('maps.id', ondelete='SET NULL'), index=True)
     num_players = Column(Integer, nullable=False)
     num_turns = Column(Integer, nullable=False)
+    num_ticks = Column(Integer, default=0, server_default='0', nullable=False)  # Stored when the game is finished.
+    state = Column(Integer, default=1, server_default='1', index=True, nullable=False)  # GameState.INIT
+    seed = Column(Integer)  # Seed of the game's random generator, replays without seed use recorded events.
     data = Column(MutableDict.as_mutable(JSON))
     actions = relationship('Action', backref='game', lazy='dynamic')
 
@@ -115,6 +124,9 @@ class Game(Base):
 class Action(Base):
 
     __tablename__ = 'actions'
+    __table_args__ = (
+        Index('ix_actions_game_id_created_at_id', 'game_id', 'created_at', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     game_id = Column(Integer, ForeignKey('games.id', ondelete='CASCADE'), index=True, nullable=False)
@@ -139,9 +151,21 @@ class Player(Base):
     name = Column(String, unique=True, index=True, nullable=False)
     password = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
+    actions = relationship('Action', backref='player', lazy='dynamic')
 
     def __eq__(self, other):
         return self.id == other.id and self.created_at == other.created_at
 
     def __repr__(self):
         return "<Player(id='{}', name='{}')>".format(self.id, self.name)
+
+
+class SchemaMigration(Base):
+
+    __tablename__ = 'schema_migrations'
+
+    name = Column(String, primary_key=True)
+    applied_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return "<SchemaMigration(name='{}', applied_at='{}')>".format(self.name, self.applied_at)
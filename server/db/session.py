@@ -2,6 +2,7 @@
 """
 from contextlib import contextmanager
 from functools import wraps
+from threading import local
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -19,6 +20,14 @@ engine = create_engine(
 )
 Session = sessionmaker(bind=engine)
 
+_request = local()  # Each request is handled by own thread.
+
+
+def get_request_session():
+    """ Returns session of the current unit of work (client command) of the thread, DB helpers pick it up implicitly.
+    """
+    return getattr(_request, 'session', None)
+
 
 @contextmanager
 def session_ctx():
@@ -33,10 +42,32 @@ def session_ctx():
         session.close()
 
 
+@contextmanager
+def request_session_ctx():
+    """ Opens one session (one transaction) for all DB helpers called inside the context.
+    Nested contexts reuse the outer session, the transaction is committed once on the outermost exit.
+    """
+    session = get_request_session()
+    if session is not None:
+        yield session
+        return
+
+    with session_ctx() as session:
+        _request.session = session
+        try:
+            yield session
+        finally:
+            _request.session = None
+
+
 def session_wrapper(function):
     @wraps(function)
     def wrapped(*args, **kwargs):
         if kwargs.get('session', None) is None:
+            session = get_request_session()
+            if session is not None:
+                kwargs['session'] = session
+                return function(*args, **kwargs)
             with session_ctx() as session:
                 kwargs['session'] = session
                 return function(*args, **kwargs)
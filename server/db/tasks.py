@@ -1,29 +1,63 @@
+import os
+import time
 import uuid
+from multiprocessing import Pool
 
 from invoke import task
 
+import errors
+import map_generator
 from config import CONFIG
-from db import game_db, map_db
+from db import game_db, map_db, migrations
 from db.models import Base
-from db.session import session_ctx, Session
+from db.session import engine, session_ctx, Session
 from defs import Action
+from entity.game import GameState
+from entity.observer import Observer
 from logger import log
 
-__all__ = ['activate_map', 'generate_map', 'generate_all_maps', 'db_init', 'generate_replay', ]
+__all__ = [
+    'activate_map', 'generate_map', 'generate_all_maps', 'generate_synthetic_map', 'db_init', 'db_migrate',
+    'generate_replay', 'verify_replays',
+]
 
 
 @task
-def generate_map(_, map_name=CONFIG.MAP_NAME):
+def generate_map(_, map_name=CONFIG.MAP_NAME, force=False):
     """ Generates a map in the DB.
     """
-    map_db.generate_maps(map_names=[map_name, ])
+    map_db.generate_maps(map_names=[map_name, ], force=force)
 
 
 @task
-def generate_all_maps(_, active_map=CONFIG.MAP_NAME):
-    """ Generates all maps in the DB.
+def generate_all_maps(_, active_map=CONFIG.MAP_NAME, force=False):
+    """ Generates all maps in the DB. Maps which have not been changed since the last generation are skipped.
     """
-    map_db.generate_maps(active_map=active_map)
+    map_db.generate_maps(active_map=active_map, force=force)
+
+
+@task
+def generate_synthetic_map(_, kind='grid', points=100, towns=4, markets=4, storages=4, min_length=1, max_length=3,
+                           spokes=4, seed=None, name=None, activate=False):
+    """ Generates a synthetic map for scale testing ('grid', 'planar' or 'hub' kind), writes the map file to
+    MAPS_SYNTHETIC_DIR and imports it in the DB.
+    """
+    name = name or '{}{}'.format(kind, points)
+    m = map_generator.generate_map(
+        name, kind=kind, points=points, towns=towns, markets=markets, storages=storages,
+        min_length=min_length, max_length=max_length, spokes=spokes, seed=None if seed is None else int(seed)
+    )
+    os.makedirs(CONFIG.MAPS_SYNTHETIC_DIR, exist_ok=True)
+    file_name = os.path.join(CONFIG.MAPS_SYNTHETIC_DIR, '{}.{}'.format(name, CONFIG.MAPS_FORMAT))
+    with open(file_name, 'w') as f:
+        f.write(map_generator.dump_map(m))
+
+    with session_ctx() as session:
+        map_db.load_map(file_name, force=True, session=session)
+        if activate:
+            map_db.set_active_map(name, session=session)
+    log.info('Map \'{}\' has been generated, points: {}, posts: {}, lines: {}, file: {}'.format(
+        name, len(m['points']), len(m['posts']), len(m['lines']), file_name))
 
 
 @task
@@ -41,6 +75,13 @@ def db_init(_):
     Base.metadata.create_all()
 
 
+@task
+def db_migrate(_):
+    """ Migrates existing DB to the current schema.
+    """
+    migrations.apply_migrations()
+
+
 @task
 def generate_replay(_, replay_name=None):
     """ Generates game with actions in the DB for test purposes.
@@ -63,6 +104,58 @@ def generate_replay(_, replay_name=None):
             log.info('Replay \'{}\' has been generated'.format(current_replay))
 
 
+@task
+def verify_replays(_, processes=None):
+    """ Re-simulates all finished games in parallel and compares final ratings with recorded ones.
+    """
+    games_idx = game_db.get_games_idx(state=GameState.FINISHED)
+    mismatched_games, total_turns = 0, 0
+    start = time.perf_counter()
+    with Pool(processes=None if processes is None else int(processes), initializer=engine.dispose) as pool:
+        for game_idx, divergent_turn, mismatches, turns, elapsed in pool.imap_unordered(verify_replay, games_idx):
+            total_turns += turns
+            log.info('Replay verified, game: {}, turns: {}, turns per second: {:.0f}'.format(
+                game_idx, turns, turns / elapsed if elapsed else 0))
+            if divergent_turn is not None:
+                mismatched_games += 1
+                log.error('Replay diverged, game: {}, turn: {}'.format(game_idx, divergent_turn))
+            elif mismatches:
+                mismatched_games += 1
+                for player_idx, recorded, replayed in mismatches:
+                    log.error('Rating mismatch, game: {}, player: {}, recorded: {}, replayed: {}'.format(
+                        game_idx, player_idx, recorded, replayed))
+    elapsed = time.perf_counter() - start
+    log.info('Replays verified: {}, mismatched: {}, turns: {}, time: {:.1f}s, turns per second: {:.0f}'.format(
+        len(games_idx), mismatched_games, total_turns, elapsed, total_turns / elapsed if elapsed else 0))
+
+
+def verify_replay(game_idx):
+    """ Re-simulates the game with observer's replay logic, stops on the first turn diverged from recorded state.
+    Returns: game index, divergent turn (None if there is no divergence), list of rating mismatches
+    (player index, recorded rating, replayed rating), number of turns and simulation time.
+    """
+    observer = Observer()
+    start = time.perf_counter()
+    observer.on_game({'idx': game_idx})
+    try:
+        observer.game_turn(observer.max_turn + 1)  # Plays all actions, including ones after the last turn.
+    except errors.WgForgeServerError as err:
+        # Games recorded without state hashes diverge with errors of replayed commands instead of ReplayDivergence:
+        log.error('Replay failed, game: {}, turn: {}, error: {}'.format(game_idx, observer.current_turn, err))
+        return game_idx, observer.current_turn, [], observer.current_turn, time.perf_counter() - start
+    elapsed = time.perf_counter() - start
+
+    game, _ = game_db.get_game(game_idx)
+    recorded = {player_idx: rating['rating'] for player_idx, rating in (game.data or {}).items()}
+    replayed = {player_idx: rating['rating'] for player_idx, rating in observer.game.map.ratings.items()}
+    mismatches = [
+        (player_idx, recorded.get(player_idx), replayed.get(player_idx))
+        for player_idx in sorted(recorded.keys() | replayed.keys())
+        if recorded.get(player_idx) != replayed.get(player_idx)
+    ]
+    return game_idx, None, mismatches, observer.current_turn, elapsed
+
+
 def generate_replay01(session: Session):
     """ Generates replay for test purposes.
     """
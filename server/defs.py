@@ -18,10 +18,16 @@ class Action(IntEnum):
     # Observer actions:
     OBSERVER = 100
     GAME = 101
+    TIMELINE = 103
 
     # This actions are not available for client:
     EVENT = 102
 
+    # Admin actions, not documented for clients:
+    TICK_PROFILE = 200
+    PROFILE = 201
+    MEMORY = 202
+
 
 class Result(IntEnum):
     """ Server response codes.
@@ -33,3 +39,14 @@ class Result(IntEnum):
     INAPPROPRIATE_GAME_STATE = 4
     TIMEOUT = 5
     INTERNAL_SERVER_ERROR = 500
+
+    # Not a response to a command, frame of the live game pushed to observers:
+    FRAME = 100
+
+
+class GameState(IntEnum):
+    """ Game states.
+    """
+    INIT = 1
+    RUN = 2
+    FINISHED = 3
@@ -1,14 +1,12 @@
 """ Game map entity.
 """
 
-from sqlalchemy import func
 from sqlalchemy.sql.expression import true
 
 import errors
-from db.models import Map as MapModel, Line as LineModel, Point as PointModel, Post as PostModel
-from db.session import session_ctx
-from entity.line import Line
-from entity.point import Point
+from db.models import Map as MapModel
+from db.session import session_wrapper
+from entity.map_cache import MAP_CACHE, MapTopology
 from entity.post import Post, PostType
 from entity.serializable import Serializable
 
@@ -30,6 +28,7 @@ class Map(Serializable):
         self.ratings = {}
 
         # Attributes not included into json representation:
+        self.adjacency = {}
         self.use_active = use_active
         self.initialized = False
         self.markets = []
@@ -39,44 +38,38 @@ class Map(Serializable):
         if self.name is not None or self.use_active:
             self.init_from_db()
 
-    def init_from_db(self):
-        with session_ctx() as session:
-            if self.name:
-                _map = session.query(MapModel).filter(MapModel.name == self.name).first()
-            elif self.use_active:
-                _map = session.query(MapModel).filter(MapModel.active == true()).first()
-            else:
-                raise errors.WgForgeServerError('Unable to initialize the map')
-
-            if _map is None:
-                raise errors.WgForgeServerError('The map is not found')
-
-            self.idx = _map.id
-            self.name = _map.name
-            self.size = (_map.size_x, _map.size_y)
-
-            lines = _map.lines.order_by(LineModel.id).all()
-            self.lines = {l.id: Line(l.id, l.length, l.p0, l.p1) for l in lines}
-
-            points = session.query(PointModel, func.max(PostModel.id)).outerjoin(
-                PostModel, PointModel.id == PostModel.point_id).filter(PointModel.map_id == _map.id).group_by(
-                PointModel.id).order_by(PointModel.id).all()
-            for point, post_id in points:
-                self.coordinates[point.id] = {'idx': point.id, 'x': point.x, 'y': point.y}
-                self.points[point.id] = Point(point.id, post_idx=post_id)
-
-            posts = _map.posts.order_by(PostModel.id).all()
-            self.posts = {
-                p.id: Post(
-                    p.id, p.name, p.type, p.population, p.armor, p.product, p.replenishment, p.point_id
-                ) for p in posts
-            }
-
-            self.markets = [m for m in self.posts.values() if m.type == PostType.MARKET]
-            self.storages = [s for s in self.posts.values() if s.type == PostType.STORAGE]
-            self.towns = [t for t in self.posts.values() if t.type == PostType.TOWN]
-
-            self.initialized = True
+    @session_wrapper
+    def init_from_db(self, session=None):
+        if self.name:
+            _map = session.query(MapModel).filter(MapModel.name == self.name).first()
+        elif self.use_active:
+            _map = session.query(MapModel).filter(MapModel.active == true()).first()
+        else:
+            raise errors.WgForgeServerError('Unable to initialize the map')
+
+        if _map is None:
+            raise errors.WgForgeServerError('The map is not found')
+
+        self.init_from_topology(MAP_CACHE.get(_map, session))
+
+    def init_from_topology(self, topology: MapTopology):
+        """ Builds the map over the shared topology, only posts are created for each map.
+        """
+        compiled_map = topology.compiled_map
+        self.idx = compiled_map.idx
+        self.name = compiled_map.name
+        self.size = compiled_map.size
+        self.lines = topology.lines
+        self.points = topology.points
+        self.coordinates = topology.coordinates
+        self.adjacency = topology.adjacency
+        self.posts = {p[0]: Post(*p) for p in compiled_map.posts}
+
+        self.markets = [m for m in self.posts.values() if m.type == PostType.MARKET]
+        self.storages = [s for s in self.posts.values() if s.type == PostType.STORAGE]
+        self.towns = [t for t in self.posts.values() if t.type == PostType.TOWN]
+
+        self.initialized = True
 
     def add_train(self, train):
         self.trains[train.idx] = train
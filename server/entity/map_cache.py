@@ -0,0 +1,129 @@
+""" Process-wide cache of compiled game maps.
+"""
+import marshal
+import mmap
+import os
+from collections import namedtuple
+from threading import Lock
+
+from sqlalchemy import func
+
+from config import CONFIG
+from db.models import Line as LineModel, Point as PointModel, Post as PostModel
+from entity.line import Line
+from entity.point import Point
+from logger import log
+
+# Compact immutable form of a map, contains only tuples of plain values:
+#   lines: ((idx, length, p0, p1), ...)
+#   points: ((idx, x, y, post_idx), ...)
+#   posts: ((idx, name, type, population, armor, product, replenishment, point_idx), ...)
+CompiledMap = namedtuple('CompiledMap', ['idx', 'name', 'size', 'lines', 'points', 'posts'])
+
+
+def compile_map(map_model, session):
+    """ Loads the map from DB and compiles it.
+    """
+    lines = map_model.lines.order_by(LineModel.id).all()
+    points = session.query(PointModel, func.max(PostModel.id)).outerjoin(
+        PostModel, PointModel.id == PostModel.point_id).filter(PointModel.map_id == map_model.id).group_by(
+        PointModel.id).order_by(PointModel.id).all()
+    posts = map_model.posts.order_by(PostModel.id).all()
+
+    return CompiledMap(
+        idx=map_model.id,
+        name=map_model.name,
+        size=(map_model.size_x, map_model.size_y),
+        lines=tuple((l.id, l.length, l.p0, l.p1) for l in lines),
+        points=tuple((p.id, p.x, p.y, post_id) for p, post_id in points),
+        posts=tuple(
+            (p.id, p.name, p.type, p.population, p.armor, p.product, p.replenishment, p.point_id) for p in posts
+        ),
+    )
+
+
+class MapTopology(object):
+    """ Immutable part of the map (lines, points, coordinates and adjacency) shared between all games on the map.
+    Must not be changed by games.
+    """
+
+    def __init__(self, compiled_map: CompiledMap):
+        self.compiled_map = compiled_map
+        self.lines = {}
+        self.points = {}
+        self.coordinates = {}
+        self.adjacency = {}  # Point's index to indexes of Lines connected to the Point.
+        for idx, length, p0, p1 in compiled_map.lines:
+            self.lines[idx] = Line(idx, length, p0, p1)
+        for idx, x, y, post_idx in compiled_map.points:
+            self.coordinates[idx] = {'idx': idx, 'x': x, 'y': y}
+            self.points[idx] = Point(idx, post_idx=post_idx)
+            self.adjacency[idx] = []
+        for line in self.lines.values():
+            for point_idx in set(line.points):
+                self.adjacency[point_idx].append(line.idx)
+        self.adjacency = {idx: tuple(lines_idx) for idx, lines_idx in self.adjacency.items()}
+
+
+class MapCache(object):
+    """ Keeps map topologies in memory and compiled maps on disk (optionally) by map's id and import id.
+    Ids of map's objects are reassigned on each import (e.g. after DB initialization), so the import id is used
+    instead of map's content hash: compiled maps of previous imports are never reused.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self._maps = {}
+        self._lock = Lock()
+
+    def get(self, map_model, session):
+        """ Returns topology of the map DB model, compiles the map if it is not cached yet.
+        """
+        key = (map_model.id, map_model.import_id)
+        topology = self._maps.get(key)
+        if topology is None:
+            with self._lock:
+                topology = self._maps.get(key)
+                if topology is None:
+                    compiled_map = self.load(key)
+                    if compiled_map is None:
+                        compiled_map = compile_map(map_model, session)
+                        self.dump(key, compiled_map)
+                    self._maps[key] = topology = MapTopology(compiled_map)
+        return topology
+
+    def clear(self):
+        """ Drops all in-memory map topologies.
+        """
+        with self._lock:
+            self._maps.clear()
+
+    def file_name(self, key):
+        map_idx, import_id = key
+        return os.path.join(self.cache_dir, '{}-{}.bin'.format(map_idx, import_id))
+
+    def load(self, key):
+        """ Loads compiled map from disk, returns None if there is no such map.
+        """
+        if self.cache_dir is None or key[1] is None or not os.path.exists(self.file_name(key)):
+            return None
+        with open(self.file_name(key), 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                compiled_map = CompiledMap(*marshal.loads(data))
+        log.debug('Compiled map has been loaded from disk: %s', compiled_map.name)
+        return compiled_map
+
+    def dump(self, key, compiled_map):
+        """ Saves compiled map to disk. Maps without import id are not saved.
+        """
+        if self.cache_dir is None or key[1] is None:
+            return
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        tmp_file_name = '{}.{}.tmp'.format(self.file_name(key), os.getpid())
+        with open(tmp_file_name, 'wb') as f:
+            marshal.dump(tuple(compiled_map), f)
+        os.replace(tmp_file_name, self.file_name(key))
+
+
+MAP_CACHE = MapCache(cache_dir=CONFIG.MAP_CACHE_DIR if CONFIG.MAP_CACHE_ON_DISK else None)
@@ -1,14 +1,22 @@
 """ Observer Entity. Handles requests when client connects to server as OBSERVER to watch replay(s).
 """
 
+from collections import deque
+from datetime import datetime
+from uuid import uuid4
+
 import errors
 from config import CONFIG
 from db import game_db, map_db
 from defs import Action, Result
 from entity.event import EventType
-from entity.game import Game
+from entity.game import Game, GameState
+from entity.map import Map
 from entity.player import Player
+from entity.replay_cache import REPLAY_CACHE
 from entity.serializable import Serializable
+from entity.simulation import Simulation
+from entity.spectator import Spectator
 from logger import log
 
 
@@ -23,17 +31,23 @@ def game_required(func):
 
 class Observer(object):
 
-    def __init__(self):
+    def __init__(self, send=None):
+        self.send = send  # Sends encoded packet to the observer's connection, used to stream live games.
+        self.spectator = None
         self.game = None
-        self.actions = []
+        self.game_idx = None
+        self.actions = deque()  # Window of replay actions which are not played yet.
+        self.action_key = None  # The (created_at, id) key of the last played action.
         self.players = {}
         self.map_name = None
         self.game_name = None
         self.current_turn = 0
-        self.current_action = 0
         self.max_turn = 0
         self.num_players = 0
         self.num_turns = 0
+        self.seed = None
+        # Key of the replay in REPLAY_CACHE, replays of finished games are shared between observers:
+        self.replay_key = None
 
     @staticmethod
     def check_keys(data: dict, keys, agg_func=all):
@@ -45,39 +59,70 @@ class Observer(object):
         else:
             return True
 
-    def games_to_json_str(self):
+    @staticmethod
+    def parse_time(data: dict, key):
+        """ Parses optional time value formatted with CONFIG.TIME_FORMAT.
+        """
+        if data.get(key) is None:
+            return None
+        try:
+            return datetime.strptime(data[key], CONFIG.TIME_FORMAT)
+        except (TypeError, ValueError):
+            raise errors.BadCommand('Wrong time format, key: {}, format: {}'.format(key, CONFIG.TIME_FORMAT))
+
+    def games_to_json_str(self, data=None):
         """ Retrieves list of games.
+        Optional filters from data: limit (page size), cursor (index of the last game on the previous page),
+        map_idx, created_from, created_to, with_data (set False to omit games ratings).
         """
+        data = {} if data is None else data
+        limit = data.get('limit', None)
+        if limit is not None and (not isinstance(limit, int) or not 0 < limit <= CONFIG.OBSERVER_GAMES_MAX_LIMIT):
+            raise errors.BadCommand(
+                'Wrong limit value, limit: {}, expected: 1..{}'.format(limit, CONFIG.OBSERVER_GAMES_MAX_LIMIT)
+            )
+        for key in ('cursor', 'map_idx'):
+            if data.get(key) is not None and not isinstance(data[key], int):
+                raise errors.BadCommand('Wrong value, key: {}, integer expected'.format(key))
+        with_data = data.get('with_data', True)
+
         games_list = []
-        for game_data, game_length in game_db.get_all_games():
+        for game_data in game_db.get_games(
+                limit=limit,
+                cursor=data.get('cursor', None),
+                map_idx=data.get('map_idx', None),
+                created_from=self.parse_time(data, 'created_from'),
+                created_to=self.parse_time(data, 'created_to'),
+                with_data=with_data,
+        ):
             game = {
                 'idx': game_data.id,
                 'name': game_data.name,
                 'created_at': game_data.created_at.strftime(CONFIG.TIME_FORMAT),
                 'map_idx': game_data.map_id,
-                'length': game_length,
+                'length': game_data.length,
                 'num_players': game_data.num_players,
-                'data': game_data.data,
             }
+            if with_data:
+                game['data'] = game_data.data
             games_list.append(game)
 
+        # Cursor for the next page, None if there are no more games:
+        cursor = games_list[-1]['idx'] if limit is not None and len(games_list) == limit else None
+
         games = Serializable()
-        games.set_attributes(games=games_list)
+        games.set_attributes(games=games_list, cursor=cursor)
         return games.to_json_str()
 
     def reset_game(self):
         """ Resets the game to initial state.
         """
-        self.game = Game(
-            self.game_name,
-            observed=True,
-            num_players=self.num_players,
-            num_turns=self.num_turns,
-            map_name=self.map_name
-        )
+        # Games with seed regenerate random events, others replay recorded events:
+        self.game = Simulation(Map(name=self.map_name), random_events=self.seed is not None, seed=self.seed)
         self.players = {}
         self.current_turn = 0
-        self.current_action = 0
+        self.actions.clear()
+        self.action_key = None
 
     def action(self, action, data):
         """ Interprets observer's actions.
@@ -93,7 +138,15 @@ class Observer(object):
         """ Returns specified game map layer.
         """
         self.check_keys(data, ['layer'])
-        message = self.game.get_map_layer(None, data['layer'])
+        game = self.game  # The live game is released by the spectator when the game is deleted.
+        if game is None:
+            raise errors.BadCommand('A game is not chosen')
+        if isinstance(game, Game):
+            message = game.get_spectator_layer(data['layer'])
+        elif data['layer'] not in Map.LAYERS:
+            raise errors.ResourceNotFound('Map layer not found, layer: {}'.format(data['layer']))
+        else:
+            message = game.map.layer_to_json_str(data['layer'])
         return Result.OKEY, message
 
     def game_turn(self, turns):
@@ -105,9 +158,11 @@ class Observer(object):
             EventType.PARASITES_ASSAULT: (self.game.make_parasites_assault, 'parasites_power'),
             EventType.REFUGEES_ARRIVAL: (self.game.make_refugees_arrival, 'refugees_number'),
         }
-        for action in self.actions[self.current_action:]:
+        while sub_turn < turns:
+            action = self.next_action()
+            if action is None:
+                break
 
-            self.current_action += 1
             code = action.code
             message = action.message
             player_idx = action.player_id
@@ -116,8 +171,7 @@ class Observer(object):
             if code == Action.LOGIN:
                 player = Player(message['name'], password=message.get('password', None))
                 player.idx = player_idx
-                self.players[player_idx] = player
-                self.game.add_player(player)
+                self.players[player_idx] = self.game.add_player(player)
 
             elif code == Action.MOVE:
                 self.game.move_train(
@@ -133,25 +187,79 @@ class Observer(object):
                 self.game.tick()
                 sub_turn += 1
                 self.current_turn += 1
+                # Stop on the first tick which state differs from the recorded one:
+                state_hash = message.get('hash')
+                if state_hash is not None and state_hash != self.game.state_hash():
+                    raise errors.ReplayDivergence(
+                        'The replay diverged from the recorded game, turn: {}'.format(self.current_turn)
+                    )
+                if self.current_turn % CONFIG.OBSERVER_KEYFRAME_INTERVAL == 0:
+                    self.capture_keyframe()
 
             elif code == Action.EVENT:
-                event, power_attr = events_map[message['type']]
-                event(message[power_attr])
+                if not self.game.random_events:
+                    event, power_attr = events_map[message['type']]
+                    event(message[power_attr])
 
             elif code == Action.LOGOUT:
                 self.game.remove_player(player)
 
             else:
-                log.error('Unknown action code: {}'.format(code))
+                log.error('Unknown action code: %s', code)
 
-            if sub_turn >= turns:
-                break
+    def next_action(self):
+        """ Returns next replay action, fetches next window of actions from DB if needed.
+        """
+        if not self.actions:
+            key = (self.replay_key, 'actions', self.action_key)
+            window = REPLAY_CACHE.get(key)
+            if window is None:
+                window = tuple(
+                    game_db.get_actions(self.game_idx, after=self.action_key, limit=CONFIG.OBSERVER_ACTIONS_WINDOW)
+                )
+                REPLAY_CACHE.put(key, window, len(window) * CONFIG.REPLAY_CACHE_ACTION_SIZE)
+            self.actions.extend(window)
+            if not self.actions:
+                return None
+        action = self.actions.popleft()
+        self.action_key = (action.created_at, action.id)
+        return action
+
+    def capture_keyframe(self):
+        """ Saves snapshot of the game at the current turn if it is not saved yet.
+        """
+        key = (self.replay_key, 'keyframe', self.current_turn)
+        if REPLAY_CACHE.get(key) is None:
+            snapshot = self.game.snapshot()
+            REPLAY_CACHE.put(key, (snapshot, self.action_key), len(snapshot))
+
+    def find_keyframe(self, turn):
+        """ Returns the nearest cached keyframe captured at or before the turn: (turn, snapshot, action key) or None.
+        """
+        keyframe_turn = turn - turn % CONFIG.OBSERVER_KEYFRAME_INTERVAL
+        while keyframe_turn > 0:
+            keyframe = REPLAY_CACHE.get((self.replay_key, 'keyframe', keyframe_turn))
+            if keyframe is not None:
+                return (keyframe_turn, ) + keyframe
+            keyframe_turn -= CONFIG.OBSERVER_KEYFRAME_INTERVAL
+        return None
+
+    def restore_keyframe(self, turn, snapshot, action_key):
+        """ Restores the game from snapshot captured at the specified turn.
+        """
+        self.game.restore(snapshot)
+        self.players = dict(self.game.players)
+        self.current_turn = turn
+        self.actions.clear()
+        self.action_key = action_key
 
     @game_required
     def on_turn(self, data):
         """ Sets specified game turn.
         """
         self.check_keys(data, ['idx'])
+        if self.spectator is not None:
+            raise errors.BadCommand('Impossible to set turn of a live game')
 
         turn = data['idx']
         turn = min(max(turn, 0), self.max_turn)
@@ -159,24 +267,81 @@ class Observer(object):
         if turn == self.current_turn:
             return Result.OKEY, None
 
-        delta_turn = turn - self.current_turn
-        if delta_turn > 0:
-            self.game_turn(delta_turn)
-        elif delta_turn < 0:
+        # Start from the nearest keyframe before the turn if it is closer than the current turn:
+        keyframe = self.find_keyframe(turn)
+        if keyframe is not None and (turn < self.current_turn or keyframe[0] > self.current_turn):
+            self.restore_keyframe(*keyframe)
+        elif turn < self.current_turn:
             self.reset_game()
-            if turn > 0:
-                self.game_turn(turn)
+
+        if turn > self.current_turn:
+            self.game_turn(turn - self.current_turn)
 
         self.current_turn = turn
 
         return Result.OKEY, None
 
+    @game_required
+    def on_timeline(self, data):
+        """ Plays the game over the range of turns ('from', 'to' and optional 'stride'), returns frames of the turns
+        in columnar form: a list of values (one per frame) for each field of each train, post and player's rating.
+        Values are None in frames where the entity does not exist.
+        """
+        self.check_keys(data, ['from', 'to'])
+        if self.spectator is not None:
+            raise errors.BadCommand('Impossible to get timeline of a live game')
+        stride = data.get('stride', 1)
+        for key, value in (('from', data['from']), ('to', data['to']), ('stride', stride)):
+            if not isinstance(value, int):
+                raise errors.BadCommand('Wrong value, key: {}, integer expected'.format(key))
+        if stride < 1:
+            raise errors.BadCommand('Wrong stride value, stride: {}, expected: 1 or more'.format(stride))
+
+        turns = range(max(data['from'], 0), min(data['to'], self.max_turn) + 1, stride)
+        if len(turns) > CONFIG.OBSERVER_TIMELINE_MAX_FRAMES:
+            raise errors.BadCommand(
+                'Too many frames, frames: {}, maximum: {}'.format(len(turns), CONFIG.OBSERVER_TIMELINE_MAX_FRAMES)
+            )
+
+        trains, posts, ratings = {}, {}, {}
+        for frame, turn in enumerate(turns):
+            self.on_turn({'idx': turn})
+            for train in self.game.trains.values():
+                self.add_frame_values(trains, train.idx, frame, train, self.TIMELINE_TRAIN_FIELDS)
+            for post in self.game.map.posts.values():
+                self.add_frame_values(posts, post.idx, frame, post, self.TIMELINE_POST_FIELDS)
+            for player_idx, rating in self.game.map.ratings.items():
+                self.add_frame_values(ratings, player_idx, frame, rating, ('rating', ))
+        for timeline in (trains, posts, ratings):
+            for columns in timeline.values():
+                for column in columns.values():
+                    column.extend([None] * (len(turns) - len(column)))
+
+        message = Serializable()
+        message.set_attributes(turns=list(turns), trains=trains, posts=posts, ratings=ratings)
+        return Result.OKEY, message.to_json_str()
+
+    @staticmethod
+    def add_frame_values(timeline, idx, frame, entity, fields):
+        """ Appends values of the entity's fields to the entity's columns of the timeline, missing fields are None.
+        """
+        columns = timeline.get(idx)
+        if columns is None:
+            columns = timeline[idx] = {field: [None] * frame for field in fields}
+        for field in fields:
+            value = entity.get(field) if isinstance(entity, dict) else getattr(entity, field, None)
+            columns[field].append(value)
+
     def on_game(self, data):
         """ Chooses a game.
         """
         self.check_keys(data, ['idx'])
+        self.close()
 
         game_idx = data['idx']
+        if data.get('live', False):
+            return self.on_live_game(game_idx)
+
         game = game_db.get_game(game_idx)
         if game is None:
             raise errors.ResourceNotFound('Game index not found, index: {}'.format(game_idx))
@@ -188,17 +353,70 @@ class Observer(object):
         self.num_players = game.num_players
         self.num_turns = game.num_turns
         self.map_name = game_map.name
-        self.actions = game_db.get_all_actions(game_idx)
+        self.game_idx = game_idx
+        # Actions of unfinished games may still change, so their replays are not shared:
+        self.replay_key = game_idx if game.state == GameState.FINISHED else (game_idx, uuid4().hex)
         self.max_turn = game_length
+        self.seed = game.seed
         self.reset_game()
-        log.info('Observer selected game: {}'.format(self.game_name))
+        log.info('Observer selected game: %s', self.game_name)
 
         return Result.OKEY, None
 
-    def on_observer(self, _):
+    def on_live_game(self, game_idx):
+        """ Attaches to a running game, frames of the game are sent to the observer after each game tick.
+        """
+        game = next((g for g in Game.GAMES.values() if g.game_idx == game_idx and not g.is_finished), None)
+        if game is None:
+            raise errors.ResourceNotFound('Running game index not found, index: {}'.format(game_idx))
+        if self.send is None:
+            raise errors.BadCommand('Live games are not available for the observer')
+
+        # The game is set before the spectator is attached, so the spectator closed by the game releases it:
+        self.spectator = Spectator(
+            self.send, name='Spectator of {}'.format(game.name), on_close=self.on_spectator_closed
+        )
+        self.game = game
+        try:
+            game.add_spectator(self.spectator)
+        except errors.InappropriateGameState:
+            self.spectator = None
+            self.game = None
+            raise
+        self.game_idx = game_idx
+        self.game_name = game.name
+        self.num_players = game.num_players
+        self.num_turns = game.num_turns
+        self.map_name = game.map.name
+        log.info('Observer attached to live game: %s', self.game_name)
+
+        return Result.OKEY, None
+
+    def on_spectator_closed(self, spectator):
+        """ Releases the live game when the spectator is dropped or the game is deleted.
+        """
+        if self.spectator is spectator:
+            self.game = None
+            self.spectator = None
+
+    def close(self):
+        """ Detaches from the live game if any, drops cached replay of the unfinished game.
+        """
+        spectator, game = self.spectator, self.game
+        if spectator is not None:
+            spectator.close()
+            if isinstance(game, Game):
+                game.remove_spectator(spectator)
+            self.spectator = None
+        if isinstance(self.replay_key, tuple):  # The replay of the unfinished game is private to the observer.
+            REPLAY_CACHE.discard(self.replay_key)
+        self.replay_key = None
+        self.game = None
+
+    def on_observer(self, data):
         """ Returns list of games.
         """
-        message = self.games_to_json_str()
+        message = self.games_to_json_str(data)
         return Result.OKEY, message
 
     ACTION_MAP = {
@@ -206,4 +424,8 @@ class Observer(object):
         Action.TURN: on_turn,
         Action.GAME: on_game,
         Action.OBSERVER: on_observer,
+        Action.GAMES: on_observer,
+        Action.TIMELINE: on_timeline,
     }
+    TIMELINE_TRAIN_FIELDS = ('line_idx', 'position', 'speed', 'goods')
+    TIMELINE_POST_FIELDS = ('population', 'product', 'armor')
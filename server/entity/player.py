@@ -31,6 +31,17 @@ class Player(Serializable):
     def __eq__(self, other):
         return self.idx == other.idx
 
+    def __getstate__(self):
+        """ Excludes the lock from copies and pickles of the player.
+        """
+        state = self.__dict__.copy()
+        state.pop('lock', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = Lock()
+
     @staticmethod
     def get(name, **kwargs):
         """ Returns instance of class Player.
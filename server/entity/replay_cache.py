@@ -0,0 +1,61 @@
+""" Process-wide cache of replays shared by all observers.
+"""
+from collections import OrderedDict
+from threading import Lock
+
+from config import CONFIG
+
+
+class ReplayCache(object):
+    """ LRU cache of replay action windows and keyframes limited by memory budget (in bytes).
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self._items = OrderedDict()  # Key to (value, size), the least recently used item goes first.
+        self._lock = Lock()
+
+    def get(self, key):
+        """ Returns cached value or None.
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def put(self, key, value, size):
+        """ Caches the value, evicts least recently used values to fit into memory budget.
+        """
+        if size > self.max_size:
+            return
+        with self._lock:
+            if key in self._items:
+                self.size -= self._items.pop(key)[1]
+            self._items[key] = (value, size)
+            self.size += size
+            while self.size > self.max_size:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.size -= evicted_size
+
+    def discard(self, replay_key):
+        """ Drops all values of the replay: keys of values are tuples starting with the replay's key.
+        """
+        with self._lock:
+            for key in [k for k in self._items if k[0] == replay_key]:
+                self.size -= self._items.pop(key)[1]
+
+    def clear(self):
+        """ Drops all cached values.
+        """
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._items)
+
+
+REPLAY_CACHE = ReplayCache(max_size=CONFIG.REPLAY_CACHE_SIZE)
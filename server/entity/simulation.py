@@ -0,0 +1,660 @@
+""" Simulation kernel. Pure game state transitions without I/O, shared by live games and replays.
+"""
+import math
+import pickle
+import random
+import zlib
+
+import errors
+from config import CONFIG
+from entity.event import EventType, Event as GameEvent
+from entity.map import Map
+from entity.player import Player
+from entity.point import Point
+from entity.post import PostType, Post
+from entity.train import Train
+
+
+class Simulation(object):
+    """ Game state and its transitions: ticks, trains moves, upgrades and events.
+    Does not log or persist anything, subclasses can override on_* hooks to do it.
+    """
+
+    def __init__(self, game_map: Map, random_events=True, seed=None):
+        self.map = game_map
+        self.random_events = random_events  # Replays of games without seed apply recorded events instead.
+        self.random = random.Random(seed)  # Own random generator makes the simulation deterministic.
+        self.current_tick = 0
+        self.players = {}
+        self.trains = {}
+        self.next_train_moves = {}
+        self.event_cooldowns = CONFIG.EVENT_COOLDOWNS_ON_START.copy()
+
+    def add_player(self, player: Player):
+        """ Adds player to the simulation: gives the player a Town and trains.
+        """
+        # If player is returning to the game:
+        if player.idx in self.players:
+            player = self.players[player.idx]
+            player.in_game = True
+            return player
+
+        self.players[player.idx] = player
+        player.in_game = True
+
+        # Pick first available Town on the map as player's Town:
+        player_town = [t for t in self.map.towns if t.player_idx is None][0]
+        player_home_point = self.map.points[player_town.point_idx]
+        player.set_home(player_home_point, player_town)
+
+        # Create trains for the player:
+        start_train_idx = len(self.trains) + 1
+        for i in range(CONFIG.TRAINS_COUNT):
+            # Create Train:
+            train = Train(idx=start_train_idx + i)
+            # Add Train:
+            player.add_train(train)
+            self.map.add_train(train)
+            self.trains[train.idx] = train
+            # Put the Train into Town:
+            self.put_train_into_town(train, with_cooldown=False)
+
+        # Set player's rating:
+        self.map.ratings[player.idx] = {
+            'rating': player.rating,
+            'name': player.name,
+            'town': player_town.name,
+            'idx': player.idx,
+        }
+
+        return player
+
+    def remove_player(self, player: Player):
+        """ Marks player as not 'in_game'.
+        """
+        player.in_game = False
+
+    def tick(self):
+        """ Makes game tick. Updates dynamic game entities.
+        """
+        self.current_tick += 1
+        for phase in self.tick_phases():
+            self.run_tick_phase(phase)
+
+    def tick_phases(self):
+        """ Returns turn steps (methods) in order of execution.
+        """
+        phases = [
+            self.update_cooldowns_on_tick,  # Update cooldowns in the beginning of the tick.
+            self.update_posts_on_tick,
+            self.update_trains_positions_on_tick,
+            self.handle_trains_collisions_on_tick,
+            self.process_trains_points_on_tick,
+            self.update_towns_on_tick,
+        ]
+        if self.random_events:
+            phases.extend((
+                self.refugees_arrival_on_tick,
+                self.hijackers_assault_on_tick,
+                self.parasites_assault_on_tick,
+            ))
+        phases.extend((
+            self.recalculate_ratings_on_tick,
+            self.retire_events_on_tick,
+        ))
+        return phases
+
+    def run_tick_phase(self, phase):
+        """ Runs the turn step, subclasses can override it to instrument steps.
+        """
+        phase()
+
+    def state_hash(self):
+        """ Returns cheap hash (CRC32) of the state defining the game's outcome: trains, posts and ratings.
+        The hash does not depend on the process, so live games and replays can be compared.
+        """
+        state = (
+            [(t.idx, t.line_idx, t.position, t.speed, t.goods, t.goods_type, t.level, t.fuel, t.cooldown)
+             for t in self.trains.values()],
+            [(p.idx, getattr(p, 'population', None), getattr(p, 'product', None), getattr(p, 'armor', None),
+              getattr(p, 'level', None)) for p in self.map.posts.values()],
+            [(idx, r['rating']) for idx, r in sorted(self.map.ratings.items())],
+        )
+        return zlib.crc32(repr(state).encode('utf-8'))
+
+    def on_event(self, event: GameEvent):
+        """ Hook called when a game event (hijackers assault, parasites assault, refugees arrival) happens.
+        """
+
+    def on_collision(self, train_1: Train, train_2: Train):
+        """ Hook called when trains collide.
+        """
+
+    def on_train_in_point(self, train: Train, point: Point, post: Post):
+        """ Hook called when the train arrives to the point, post is None if there is no post in the point.
+        """
+
+    def on_upgrade(self, entity):
+        """ Hook called when the post or the train has been upgraded.
+        """
+
+    def snapshot(self):
+        """ Returns the game's mutable state pickled, the game can be restored from it later.
+        """
+        return pickle.dumps({
+            'current_tick': self.current_tick,
+            'random': self.random.getstate(),
+            'players': self.players,
+            'trains': self.trains,
+            'next_train_moves': self.next_train_moves,
+            'event_cooldowns': self.event_cooldowns,
+            'posts': self.map.posts,
+            'markets': self.map.markets,
+            'storages': self.map.storages,
+            'towns': self.map.towns,
+            'map_trains': self.map.trains,
+            'ratings': self.map.ratings,
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def restore(self, snapshot):
+        """ Restores the game's mutable state from the snapshot. The snapshot can be reused.
+        """
+        snapshot = pickle.loads(snapshot)
+        self.current_tick = snapshot['current_tick']
+        self.random.setstate(snapshot['random'])
+        self.players = snapshot['players']
+        self.trains = snapshot['trains']
+        self.next_train_moves = snapshot['next_train_moves']
+        self.event_cooldowns = snapshot['event_cooldowns']
+        self.map.posts = snapshot['posts']
+        self.map.markets = snapshot['markets']
+        self.map.storages = snapshot['storages']
+        self.map.towns = snapshot['towns']
+        self.map.trains = snapshot['map_trains']
+        self.map.ratings = snapshot['ratings']
+
+    def train_in_point(self, train: Train, point_idx: int):
+        """ Makes all needed actions when Train arrives to Point.
+        Applies next Train move if it exist, processes Post if exist in the Point.
+        """
+        point = self.map.points[point_idx]
+        post = None if point.post_idx is None else self.map.posts[point.post_idx]
+        if post is not None:
+            self.train_in_post(train, post)
+
+        self.on_train_in_point(train, point, post)
+
+        self.apply_next_train_move(train)
+
+    def apply_next_train_move(self, train: Train):
+        """ Applies postponed Train MOVE if it exist.
+        """
+        if train.idx in self.next_train_moves:
+            next_move = self.next_train_moves[train.idx]
+            # If next line the same as previous:
+            # TODO: This case is not possible?
+            if next_move['line_idx'] == train.line_idx:
+                if train.speed > 0 and train.position == self.map.lines[train.line_idx].length:
+                    train.speed = 0
+                elif train.speed < 0 and train.position == 0:
+                    train.speed = 0
+            # If next line differs from previous:
+            else:
+                train.speed = next_move['speed']
+                train.line_idx = next_move['line_idx']
+                if train.speed > 0:
+                    train.position = 0
+                elif train.speed < 0:
+                    train.position = self.map.lines[train.line_idx].length
+        # The train hasn't got next move data, stop the train.
+        else:
+            train.speed = 0
+
+    def move_train(self, player, train_idx, speed, line_idx):
+        """ Process action MOVE. Changes path or speed of the Train.
+        """
+        if train_idx not in self.trains:
+            raise errors.ResourceNotFound('Train index not found, index: {}'.format(train_idx))
+        if line_idx not in self.map.lines:
+            raise errors.ResourceNotFound('Line index not found, index: {}'.format(line_idx))
+        train = self.trains[train_idx]
+        if train.player_idx != player.idx:
+            raise errors.AccessDenied('Train\'s owner mismatch')
+        if train_idx in self.next_train_moves:
+            self.next_train_moves.pop(train_idx)
+
+        # Check cooldown for the train:
+        if train.cooldown > 0:
+            raise errors.BadCommand('The train is under cooldown, cooldown: {}'.format(train.cooldown))
+
+        # Stop the train; reverse direction on move; continue run the train:
+        if speed == 0 or train.line_idx == line_idx:
+            train.speed = speed
+
+        # The train is standing:
+        elif train.speed == 0:
+            # The train is standing at the end of the line:
+            if self.map.lines[train.line_idx].length == train.position:
+                line_from = self.map.lines[train.line_idx]
+                line_to = self.map.lines[line_idx]
+                if line_from.points[1] in line_to.points:
+                    train.line_idx = line_idx
+                    train.speed = speed
+                    if line_from.points[1] == line_to.points[0]:
+                        train.position = 0
+                    else:
+                        train.position = line_to.length
+                else:
+                    raise errors.BadCommand(
+                        'The end of the train\'s line is not connected to the next line, '
+                        'train\'s line: {}, next line: {}'.format(line_from, line_to)
+                    )
+            # The train is standing at the beginning of the line:
+            elif train.position == 0:
+                line_from = self.map.lines[train.line_idx]
+                line_to = self.map.lines[line_idx]
+                if line_from.points[0] in line_to.points:
+                    train.line_idx = line_idx
+                    train.speed = speed
+                    if line_from.points[0] == line_to.points[0]:
+                        train.position = 0
+                    else:
+                        train.position = line_to.length
+                else:
+                    raise errors.BadCommand(
+                        'The beginning of the train\'s line is not connected to the next line, '
+                        'train\'s line: {}, next line: {}'.format(line_from, line_to)
+                    )
+            # The train is standing on the line (between line's points), player have to continue run the train.
+            else:
+                raise errors.BadCommand(
+                    'The train is standing on the line (between line\'s points), '
+                    'player have to continue run the train'
+                )
+
+        # The train is moving on the line (between line's points):
+        elif train.speed != 0 and train.line_idx != line_idx:
+            switch_line_possible = False
+            line_from = self.map.lines[train.line_idx]
+            line_to = self.map.lines[line_idx]
+            if train.speed > 0 and speed > 0:
+                switch_line_possible = (line_from.points[1] == line_to.points[0])
+            elif train.speed > 0 and speed < 0:
+                switch_line_possible = (line_from.points[1] == line_to.points[1])
+            elif train.speed < 0 and speed > 0:
+                switch_line_possible = (line_from.points[0] == line_to.points[0])
+            elif train.speed < 0 and speed < 0:
+                switch_line_possible = (line_from.points[0] == line_to.points[1])
+
+            # This train move request is valid and will be applied later:
+            if switch_line_possible:
+                self.next_train_moves[train_idx] = {'speed': speed, 'line_idx': line_idx}
+            # This train move request is invalid:
+            else:
+                raise errors.BadCommand(
+                    'The train is not able to switch the current line to the next line, '
+                    'or new speed is incorrect, train\'s line: {}, next line: {}, '
+                    'train\'s speed: {}, new speed: {}'.format(line_from, line_to, train.speed, speed)
+                )
+
+    def train_in_post(self, train: Train, post: Post):
+        """ Makes all needed actions when Train arrives to Post.
+        Behavior depends on PostType, train can be loaded or unloaded.
+        """
+        if post.type == PostType.TOWN and train.player_idx == post.player_idx:
+            # Unload product from train to town:
+            goods = 0
+            if train.goods_type == PostType.MARKET:
+                goods = max(min(train.goods, post.product_capacity - post.product), 0)
+                post.product += goods
+                if post.product >= post.product_capacity:
+                    post.events.append(GameEvent(EventType.RESOURCE_OVERFLOW, self.current_tick, product=post.product))
+            elif train.goods_type == PostType.STORAGE:
+                goods = max(min(train.goods, post.armor_capacity - post.armor), 0)
+                post.armor += goods
+                if post.armor >= post.armor_capacity:
+                    post.events.append(GameEvent(EventType.RESOURCE_OVERFLOW, self.current_tick, armor=post.armor))
+
+            if CONFIG.TRAIN_ALWAYS_DEVASTATED:
+                train.goods = 0
+            else:
+                train.goods -= goods
+            if train.goods == 0:
+                train.goods_type = None
+
+            # Fill up trains's tank:
+            train.fuel = train.fuel_capacity
+
+        elif post.type == PostType.MARKET:
+            # Load product from market to train:
+            if train.goods_type is None or train.goods_type == post.type:
+                product = max(min(post.product, train.goods_capacity - train.goods), 0)
+                post.product -= product
+                train.goods += product
+                train.goods_type = post.type
+
+        elif post.type == PostType.STORAGE:
+            # Load armor from storage to train:
+            if train.goods_type is None or train.goods_type == post.type:
+                armor = max(min(post.armor, train.goods_capacity - train.goods), 0)
+                post.armor -= armor
+                train.goods += armor
+                train.goods_type = post.type
+
+    def put_train_into_town(self, train: Train, with_unload=True, with_cooldown=True):
+        """ Puts given Train to his Town.
+        """
+        # Get Train owner's home point:
+        player_home_point = self.players[train.player_idx].home
+        # Use first Line connected to the home point as default train's line:
+        line = self.map.lines[self.map.adjacency[player_home_point.idx][0]]
+        train.line_idx = line.idx
+        # Set Train's position at the Town:
+        if player_home_point.idx == line.points[0]:
+            train.position = 0
+        else:
+            train.position = line.length
+        # Stop Train:
+        train.speed = 0
+        # Unload the Train:
+        if with_unload:
+            train.goods = 0
+            train.goods_type = None
+        # Set cooldown for the Train:
+        if with_cooldown:
+            # Get Train owner's town:
+            player_town = self.players[train.player_idx].town
+            train.cooldown = player_town.train_cooldown
+
+    def make_hijackers_assault(self, hijackers_power):
+        """ Makes hijackers assault which decreases quantity of Town's armor and population.
+        """
+        event = GameEvent(EventType.HIJACKERS_ASSAULT, self.current_tick, hijackers_power=hijackers_power)
+        for player in self.players.values():
+            player.town.population = max(player.town.population - max(hijackers_power - player.town.armor, 0), 0)
+            player.town.armor = max(player.town.armor - hijackers_power, 0)
+            player.town.events.append(event)
+        self.event_cooldowns[EventType.HIJACKERS_ASSAULT] = round(
+            hijackers_power * CONFIG.HIJACKERS_COOLDOWN_COEFFICIENT)
+        self.on_event(event)
+
+    def hijackers_assault_on_tick(self):
+        """ Makes randomly hijackers assault if it is possible.
+        """
+        # Check cooldown for this Event:
+        if self.event_cooldowns.get(EventType.HIJACKERS_ASSAULT, 0) > 0:
+            return
+
+        rand_percent = self.random.randint(1, 100)
+        if rand_percent <= CONFIG.HIJACKERS_ASSAULT_PROBABILITY:
+            hijackers_power = self.random.randint(*CONFIG.HIJACKERS_POWER_RANGE)
+            self.make_hijackers_assault(hijackers_power)
+
+    def make_parasites_assault(self, parasites_power):
+        """ Makes parasites assault which decreases quantity of Town's product.
+        """
+        event = GameEvent(EventType.PARASITES_ASSAULT, self.current_tick, parasites_power=parasites_power)
+        for player in self.players.values():
+            player.town.product = max(player.town.product - parasites_power, 0)
+            player.town.events.append(event)
+        self.event_cooldowns[EventType.PARASITES_ASSAULT] = round(
+            parasites_power * CONFIG.PARASITES_COOLDOWN_COEFFICIENT)
+        self.on_event(event)
+
+    def parasites_assault_on_tick(self):
+        """ Makes randomly parasites assault if it is possible.
+        """
+        # Check cooldown for this Event:
+        if self.event_cooldowns.get(EventType.PARASITES_ASSAULT, 0) > 0:
+            return
+
+        rand_percent = self.random.randint(1, 100)
+        if rand_percent <= CONFIG.PARASITES_ASSAULT_PROBABILITY:
+            parasites_power = self.random.randint(*CONFIG.PARASITES_POWER_RANGE)
+            self.make_parasites_assault(parasites_power)
+
+    def make_refugees_arrival(self, refugees_number):
+        """ Makes refugees arrival which increases quantity of Town's population.
+        """
+        event = GameEvent(EventType.REFUGEES_ARRIVAL, self.current_tick, refugees_number=refugees_number)
+        for player in self.players.values():
+            player.town.population += max(
+                min(player.town.population_capacity - player.town.population, refugees_number), 0
+            )
+            player.town.events.append(event)
+            if player.town.population == player.town.population_capacity:
+                player.town.events.append(
+                    GameEvent(EventType.RESOURCE_OVERFLOW, self.current_tick, population=player.town.population)
+                )
+        self.event_cooldowns[EventType.REFUGEES_ARRIVAL] = round(
+            refugees_number * CONFIG.REFUGEES_COOLDOWN_COEFFICIENT)
+        self.on_event(event)
+
+    def refugees_arrival_on_tick(self):
+        """ Makes randomly refugees arrival if it is possible.
+        """
+        # Check cooldown for this Event:
+        if self.event_cooldowns.get(EventType.REFUGEES_ARRIVAL, 0) > 0:
+            return
+
+        rand_percent = self.random.randint(1, 100)
+        if rand_percent <= CONFIG.REFUGEES_ARRIVAL_PROBABILITY:
+            refugees_number = self.random.randint(*CONFIG.REFUGEES_NUMBER_RANGE)
+            self.make_refugees_arrival(refugees_number)
+
+    def update_posts_on_tick(self):
+        """ Updates all markets and storages.
+        """
+        for market in self.map.markets:
+            if market.product < market.product_capacity:
+                market.product = max(min(market.product + market.replenishment, market.product_capacity), 0)
+        for storage in self.map.storages:
+            if storage.armor < storage.armor_capacity:
+                storage.armor = max(min(storage.armor + storage.replenishment, storage.armor_capacity), 0)
+
+    def update_trains_positions_on_tick(self):
+        """ Update trains positions.
+        """
+        for train in self.trains.values():
+            if CONFIG.FUEL_ENABLED and train.speed != 0:
+                train.fuel -= train.fuel_consumption
+                if train.fuel < 0:
+                    self.put_train_into_town(train, with_unload=True, with_cooldown=True)
+            line = self.map.lines[train.line_idx]
+            if train.speed > 0 and train.position < line.length:
+                train.position += 1
+            elif train.speed < 0 and train.position > 0:
+                train.position -= 1
+
+    def process_trains_points_on_tick(self):
+        """ Update trains positions, process points.
+        """
+        for train in self.trains.values():
+            line = self.map.lines[train.line_idx]
+            if train.position == line.length or train.position == 0:
+                self.train_in_point(train, line.points[self.get_sign(train.position)])
+
+    def update_towns_on_tick(self):
+        """ Update population and products in Towns.
+        """
+        for player in self.players.values():
+            if player.town.product < player.town.population:
+                player.town.population = max(player.town.population - 1, 0)
+            player.town.product = max(player.town.product - player.town.population, 0)
+            if player.town.population == 0:
+                # TODO: process game over?
+                player.town.events.append(GameEvent(EventType.GAME_OVER, self.current_tick, population=0))
+            if player.town.product == 0:
+                player.town.events.append(GameEvent(EventType.RESOURCE_LACK, self.current_tick, product=0))
+            if player.town.armor == 0:
+                player.town.events.append(GameEvent(EventType.RESOURCE_LACK, self.current_tick, armor=0))
+
+    @staticmethod
+    def get_sign(variable):
+        """ Returns sign of the variable.
+         1 if variable >  0
+        -1 if variable <  0
+         0 if variable == 0
+        """
+        return variable and (1, -1)[variable < 0]
+
+    def is_train_at_point(self, train: Train, point_to_check: Point = None):
+        """ Returns Point if the Train at some Point now, else returns False.
+        """
+        line = self.map.lines[train.line_idx]
+        if train.position == line.length or train.position == 0:
+            point_idx = line.points[self.get_sign(train.position)]
+            point = self.map.points[point_idx]
+            if point_to_check is None or point_to_check.idx == point.idx:
+                return point
+        return False
+
+    def is_train_at_post(self, train: Train, post_to_check: Post = None):
+        """ Returns Post if the Train at some Post now, else returns False.
+        """
+        point = self.is_train_at_point(train)
+        if point and point.post_idx:
+            post = self.map.posts[point.post_idx]
+            if post_to_check is None or post_to_check.idx == post.idx:
+                return post
+        return False
+
+    def make_collision(self, train_1: Train, train_2: Train):
+        """ Makes collision between two trains.
+        """
+        self.put_train_into_town(train_1, with_unload=True, with_cooldown=True)
+        self.put_train_into_town(train_2, with_unload=True, with_cooldown=True)
+        train_1.events.append(GameEvent(EventType.TRAIN_COLLISION, self.current_tick, train=train_2.idx))
+        train_2.events.append(GameEvent(EventType.TRAIN_COLLISION, self.current_tick, train=train_1.idx))
+        self.on_collision(train_1, train_2)
+
+    def handle_trains_collisions_on_tick(self):
+        """ Handles Trains collisions.
+        """
+        if not CONFIG.COLLISIONS_ENABLED:
+            return
+
+        collision_pairs = []
+        trains = list(self.trains.values())
+        for i, train_1 in enumerate(trains):
+            # Get Line and Point of train_1:
+            line_1 = self.map.lines[train_1.line_idx]
+            point_1 = self.is_train_at_point(train_1)
+            for train_2 in trains[i + 1:]:
+                # Get Line and Point of train_2:
+                line_2 = self.map.lines[train_2.line_idx]
+                point_2 = self.is_train_at_point(train_2)
+                # If train_1 and train_2 at the same Point:
+                if point_1 and point_2 and point_1.idx == point_2.idx:
+                    post = None if point_1.post_idx is None else self.map.posts[point_1.post_idx]
+                    if post is not None and post.type in {PostType.TOWN, }:
+                        continue
+                    else:
+                        collision_pairs.append((train_1, train_2))
+                        continue
+                # If train_1 and train_2 on the same Line:
+                if line_1.idx == line_2.idx:
+                    # If train_1 and train_2 have the same position:
+                    if train_1.position == train_2.position:
+                        collision_pairs.append((train_1, train_2))
+                        continue
+                    # Skip if train_1 or train_2 has been stopped and they have different positions:
+                    if train_1.speed == 0 or train_2.speed == 0:
+                        continue
+                    # Calculating distance between train_1 and train_2 now and after next tick:
+                    train_step_1 = self.get_sign(train_1.speed)
+                    train_step_2 = self.get_sign(train_2.speed)
+                    dist_after_tick = math.fabs(train_1.position - train_2.position)
+                    dist_before_tick = math.fabs((train_1.position - train_step_1) - (train_2.position - train_step_2))
+                    # If after next tick train_1 and train_2 cross:
+                    if dist_before_tick == dist_after_tick == 1 and train_step_1 + train_step_2 == 0:
+                        collision_pairs.append((train_1, train_2))
+                        continue
+        for pair in collision_pairs:
+            self.make_collision(*pair)
+
+    def make_upgrade(self, player: Player, posts_idx=(), trains_idx=()):
+        """ Upgrades given Posts and Trains to next level.
+        """
+        # Get posts from request:
+        posts = []
+        for post_idx in posts_idx:
+            if post_idx not in self.map.posts:
+                raise errors.ResourceNotFound('Post index not found, index: {}'.format(post_idx))
+            post = self.map.posts[post_idx]
+            if post.type != PostType.TOWN:
+                raise errors.BadCommand('The post is not a Town, post: {}'.format(post))
+            if post.player_idx != player.idx:
+                raise errors.AccessDenied('Town\'s owner mismatch')
+            posts.append(post)
+
+        # Get trains from request:
+        trains = []
+        for train_idx in trains_idx:
+            if train_idx not in self.trains:
+                raise errors.ResourceNotFound('Train index not found, index: {}'.format(train_idx))
+            train = self.trains[train_idx]
+            if train.player_idx != player.idx:
+                raise errors.AccessDenied('Train\'s owner mismatch')
+            trains.append(train)
+
+        # Check existence of next level for each entity:
+        posts_has_next_lvl = all([p.level + 1 in CONFIG.TOWN_LEVELS for p in posts])
+        trains_has_next_lvl = all([t.level + 1 in CONFIG.TRAIN_LEVELS for t in trains])
+        if not all([posts_has_next_lvl, trains_has_next_lvl]):
+            raise errors.BadCommand('Not all entities requested for upgrade have next levels')
+
+        # Check armor quantity for upgrade:
+        armor_to_up_posts = sum([p.next_level_price for p in posts])
+        armor_to_up_trains = sum([t.next_level_price for t in trains])
+        armor_to_up = sum([armor_to_up_posts, armor_to_up_trains])
+        if player.town.armor < armor_to_up:
+            raise errors.BadCommand(
+                'Not enough armor resource for upgrade, player\'s armor: {}, '
+                'armor needed to upgrade: {}'.format(player.town.armor, armor_to_up)
+            )
+
+        # Check that trains are in town now:
+        for train in trains:
+            if not self.is_train_at_post(train, post_to_check=player.town):
+                raise errors.BadCommand('The train is not in Town now, train: {}'.format(train))
+
+        # Upgrade entities:
+        for post in posts:
+            player.town.armor -= post.next_level_price
+            post.set_level(post.level + 1)
+            self.on_upgrade(post)
+        for train in trains:
+            player.town.armor -= train.next_level_price
+            train.set_level(train.level + 1)
+            self.on_upgrade(train)
+
+    def update_cooldowns_on_tick(self):
+        """ Decreases all cooldown values on game tick.
+        """
+        # Update cooldowns for random events:
+        for event in self.event_cooldowns:
+            if self.event_cooldowns[event] != 0:
+                self.event_cooldowns[event] = max(self.event_cooldowns[event] - 1, 0)
+
+        # Update cooldowns for trains:
+        for train in self.trains.values():
+            if train.cooldown != 0:
+                train.cooldown = max(train.cooldown - 1, 0)
+
+    def recalculate_ratings_on_tick(self):
+        """ Recalculates rating for all players on game tick.
+        """
+        ratings = self.map.ratings
+        for player in self.players.values():
+            player.recalculate_rating()
+            ratings[player.idx]['rating'] = player.rating
+
+    def retire_events_on_tick(self):
+        """ Deletes old event messages and leaves only last event messages.
+        """
+        for train in self.trains.values():
+            train.events = train.events[-CONFIG.MAX_EVENT_MESSAGES:]
+        for post in self.map.posts.values():
+            post.events = post.events[-CONFIG.MAX_EVENT_MESSAGES:]
+
@@ -0,0 +1,74 @@
+""" Spectator Entity. Streams frames of a live game to an observer's connection.
+"""
+from queue import Queue, Full
+from threading import Thread
+
+from config import CONFIG
+from logger import log
+
+
+def encode_response(result, message=''):
+    """ Encodes server response packet: result code, message length and message.
+    """
+    return b''.join((
+        result.to_bytes(CONFIG.RESULT_HEADER, byteorder='little'),
+        len(message).to_bytes(CONFIG.MSGLEN_HEADER, byteorder='little'),
+        message.encode('utf-8'),
+    ))
+
+
+class Spectator(Thread):
+    """ Sends frames of a live game to the connection from own thread, so a slow spectator never blocks the game.
+    Frames which do not fit into the spectator's queue are skipped, the spectator is dropped after
+    CONFIG.SPECTATOR_MAX_SKIPPED_FRAMES skipped frames in a row.
+    on_close: called with the spectator once it is closed (dropped, detached or the game is deleted)
+    """
+
+    def __init__(self, send, name=None, on_close=None):
+        super(Spectator, self).__init__(name=name, daemon=True)
+        self.send = send
+        self.on_close = on_close
+        self.closed = False
+        self.skipped_frames = 0
+        self._frames = Queue(maxsize=CONFIG.SPECTATOR_QUEUE_SIZE)
+
+    def push(self, packet):
+        """ Enqueues the frame packet without blocking. Returns False if the spectator has to be dropped.
+        """
+        if self.closed:
+            return False
+        try:
+            self._frames.put_nowait(packet)
+            self.skipped_frames = 0
+        except Full:
+            self.skipped_frames += 1
+            if self.skipped_frames > CONFIG.SPECTATOR_MAX_SKIPPED_FRAMES:
+                log.warning('Spectator is too slow, dropped: %s', self.name)
+                self.close()
+                return False
+        return True
+
+    def close(self):
+        """ Stops sending frames.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._frames.put_nowait(None)
+        except Full:
+            pass  # The sender thread checks 'closed' flag on the next frame.
+        if self.on_close is not None:
+            self.on_close(self)
+
+    def run(self):
+        """ Thread's activity. Sends enqueued frames.
+        """
+        while not self.closed:
+            packet = self._frames.get()
+            if packet is None or self.closed:
+                break
+            try:
+                self.send(packet)
+            except OSError:
+                self.close()
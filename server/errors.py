@@ -26,3 +26,11 @@ class AccessDenied(WgForgeServerError):
 
 class ResourceNotFound(WgForgeServerError):
     pass
+
+
+class ReplayDivergence(WgForgeServerError):
+    pass
+
+
+class ServerOverloaded(WgForgeServerError):
+    pass
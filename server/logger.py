@@ -1,10 +1,17 @@
 """ Server queued logger.
 """
 
+import gzip
 import logging
 import os
+import shutil
+import sys
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing import Queue, Process, Event
-from queue import Empty
+from queue import Empty, Full
+from threading import Lock, Thread
 from config import CONFIG
 
 LOGGERS = {}
@@ -12,13 +19,23 @@ LOGGERS = {}
 
 class DefaultLogger(logging.Logger):
     """ Default game logger class to format each record with game.
+    Messages can be passed with %-style arguments, they are formatted only if the record is emitted.
+    Records of games have 'game_idx' attribute.
     """
 
-    def _log(self, level, msg, *args, **kwargs):
+    def _log(self, level, msg, args, **kwargs):
         game = kwargs.pop('game', None)
         if game:
-            msg = '[{}] {}'.format(game, msg)
-        return super()._log(level, msg, *args, **kwargs)
+            prefix = '[{}] '.format(game)
+            # Game names come from clients, so they must not break %-formatting of the message:
+            msg = (prefix.replace('%', '%%') if args else prefix) + msg
+            kwargs['extra'] = dict(kwargs.get('extra') or {}, game_idx=getattr(game, 'game_idx', None))
+        return super()._log(level, msg, args, **kwargs)
+
+    def finish_game(self, game_idx):
+        """ Marks the end of the game's records. Regular logger doesn't route records of games, so does nothing.
+        """
+        pass
 
 
 logging.setLoggerClass(DefaultLogger)
@@ -28,121 +45,412 @@ class QueueHandler(logging.Handler):
     """ This handler sends events to a queue. Typically, it would be used together with a multiprocessing
     Queue to centralise logging to file in one process (in a multi-process application), so as to avoid
     file write contention between processes.
+    Records are formatted to strings in the logging thread and sent in batches of CONFIG.LOG_BATCH_SIZE records,
+    incomplete batch is sent after CONFIG.LOG_FLUSH_INTERVAL seconds.
+    If the queue is full (the listener can't keep up), records are dropped according to the drop policy
+    and the number of dropped records is logged every CONFIG.LOG_DROP_SUMMARY_INTERVAL seconds.
+    Retained records wait for the next batch. When there are more than
+    CONFIG.LOG_MAX_PENDING_BATCHES * CONFIG.LOG_BATCH_SIZE records pending, records of the lowest levels are dropped
+    (the oldest first), records of ERROR and higher levels are never dropped.
     """
 
-    def __init__(self, queue):
+    def __init__(self, queue, drop_policy=None, max_pending=None):
         """ Initialise an instance, using the passed queue.
+        drop_policy: level name to N, only each N-th record of the level is kept when the queue is full
+                     (0 - all records are dropped), records of other levels are never dropped by the policy
+        max_pending: maximum number of records pending while the queue is full
         """
         super(QueueHandler, self).__init__()
         self.queue = queue
-
-    def enqueue(self, record):
-        """ Enqueue a record. The base implementation uses put_nowait. You may want to override this method
+        self.drop_policy = {
+            logging.getLevelName(level): rate
+            for level, rate in (CONFIG.LOG_DROP_POLICY if drop_policy is None else drop_policy).items()
+        }
+        self.max_pending = (
+            CONFIG.LOG_MAX_PENDING_BATCHES * CONFIG.LOG_BATCH_SIZE if max_pending is None else max_pending
+        )
+        self.dropped = Counter()  # Level name to the number of dropped records.
+        self._dropped_since_summary = Counter()
+        self._summary_at = time.monotonic()
+        self._sampled = Counter()  # Level number to the number of records passed through the drop policy.
+        self._batch = []
+        self._batch_shed = 0  # Number of leading records of the batch which have already passed the drop policy.
+        self._batch_started_at = None
+        self._flusher = None
+
+    def enqueue(self, batch):
+        """ Enqueue a batch of records. The base implementation uses put_nowait. You may want to override this method
         if you want to use blocking, timeouts or custom queue implementations.
         """
-        self.queue.put_nowait(record)
+        self.queue.put_nowait(batch)
 
     def prepare(self, record):
-        """ Prepares a record for queuing. The object returned by this method is enqueued.
-        The base implementation formats the record to merge the message and arguments, and removes unpickleable
-        items from the record in-place. You might want to override this method if you want to convert the record
-        to a dict or JSON string, or send a modified copy of the record while leaving the original intact.
-        """
-        # The format operation gets traceback text into record.exc_text
-        # (if there's exception data), and also puts the message into
-        # record.message. We can then use this to replace the original
-        # msg + args, as these might be unpickleable. We also zap the
-        # exc_info attribute, as it's no longer needed and, if not None,
-        # will typically not be pickleable.
-        self.format(record)
-        record.msg = record.message
-        record.args = None
-        record.exc_info = None
-        return record
+        """ Prepares a record for queuing. The object returned by this method is enqueued as a part of batch.
+        The record is formatted to string (with traceback text if there's exception data), so only the level,
+        the game's index and the string are pickled and sent to the listener.
+        """
+        return record.levelno, getattr(record, 'game_idx', None), self.format(record)
+
+    def finish_game(self, game_idx):
+        """ Adds the mark of the game's end to the batch, the mark is a record without string.
+        """
+        with self.lock:
+            if not self._batch:
+                self._batch_started_at = time.monotonic()
+            self._batch.append((logging.NOTSET, game_idx, None))
 
     def emit(self, record):
-        """ Emit a record. Writes the LogRecord to the queue, preparing it for pickling first.
+        """ Emit a record. Adds formatted record to the batch, sends the batch to the queue if it is full.
         """
         try:
-            self.enqueue(self.prepare(record))
+            if self._flusher is None or not self._flusher.is_alive():
+                # The flusher is started lazily, so forked processes get own flusher:
+                self._flusher = Thread(target=self._flush_periodically, daemon=True)
+                self._flusher.start()
+            if not self._batch:
+                self._batch_started_at = time.monotonic()
+            self._batch.append(self.prepare(record))
+            if len(self._batch) >= CONFIG.LOG_BATCH_SIZE:
+                self.send()
         except (KeyboardInterrupt, SystemExit):
             raise
         except:
             self.handleError(record)
 
+    def send(self):
+        """ Sends collected batch of records to the queue. Must be called with acquired handler's lock.
+        If the queue is full, the batch is shed and retained records are sent with the next batch.
+        """
+        if self._batch:
+            try:
+                self.enqueue(self._batch)
+            except Full:
+                self._batch = self.trim(self._batch[:self._batch_shed] + self.shed(self._batch[self._batch_shed:]))
+                self._batch_shed = len(self._batch)
+            else:
+                self._batch, self._batch_shed = [], 0
+
+    def shed(self, records):
+        """ Applies the drop policy to the records, counts dropped records. Returns retained records.
+        """
+        retained = []
+        for record in records:
+            levelno = record[0]
+            rate = self.drop_policy.get(levelno)
+            if rate is not None:
+                self._sampled[levelno] += 1
+                if not rate or self._sampled[levelno] % rate:
+                    level_name = logging.getLevelName(levelno)
+                    self.dropped[level_name] += 1
+                    self._dropped_since_summary[level_name] += 1
+                    continue
+            retained.append(record)
+        return retained
+
+    def trim(self, records):
+        """ Drops records over the limit of pending records, counts dropped records. Records of the lowest levels
+        are dropped first, the oldest of them first. Records of ERROR and higher levels and marks of games' ends
+        are kept, so the limit may be exceeded by them. Returns retained records.
+        """
+        overflow = len(records) - self.max_pending
+        if overflow <= 0:
+            return records
+        dropped = sorted(
+            (levelno, i) for i, (levelno, _, line) in enumerate(records)
+            if line is not None and levelno < logging.ERROR
+        )[:overflow]
+        for levelno, _ in dropped:
+            level_name = logging.getLevelName(levelno)
+            self.dropped[level_name] += 1
+            self._dropped_since_summary[level_name] += 1
+        dropped = {i for _, i in dropped}
+        return [record for i, record in enumerate(records) if i not in dropped]
+
+    def summarize(self):
+        """ Adds the warning with numbers of records dropped since the last summary to the batch.
+        Must be called with acquired handler's lock.
+        """
+        if self._dropped_since_summary:
+            dropped = ', '.join('{}={}'.format(*item) for item in sorted(self._dropped_since_summary.items()))
+            record = logging.makeLogRecord({
+                'levelno': logging.WARNING,
+                'levelname': logging.getLevelName(logging.WARNING),
+                'msg': 'Log queue is full, dropped records: {}'.format(dropped),
+            })
+            if not self._batch:
+                self._batch_started_at = time.monotonic()
+            self._batch.append(self.prepare(record))
+            self._dropped_since_summary.clear()
+        self._summary_at = time.monotonic()
+
+    def flush(self):
+        """ Sends incomplete batch of records to the queue.
+        """
+        with self.lock:
+            self.summarize()
+            self.send()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(CONFIG.LOG_FLUSH_INTERVAL)
+            with self.lock:
+                if time.monotonic() - self._summary_at >= CONFIG.LOG_DROP_SUMMARY_INTERVAL:
+                    self.summarize()
+                if self._batch and time.monotonic() - self._batch_started_at >= CONFIG.LOG_FLUSH_INTERVAL:
+                    self.send()
+
+
+class StreamWriter(object):
+    """ Writes formatted records to the stream (stderr by default), the stream is flushed by the listener.
+    """
+    terminator = '\r\n'  # Carriage return ('\r') is needed when terminal is in raw/cbreak mode.
+
+    def __init__(self, stream=None, level=logging.NOTSET):
+        self.stream = sys.stderr if stream is None else stream
+        self.level = level
+
+    def write(self, lines):
+        if lines:
+            self.stream.write(self.terminator.join(lines) + self.terminator)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+
+
+class RotatingFileWriter(StreamWriter):
+    """ Writes formatted records to the file through large buffer, rotates the file when it reaches max_bytes:
+    'name.log' is renamed to 'name.log.1', 'name.log.1' to 'name.log.2', and so on up to backup_count files.
+    """
+    terminator = '\n'
+
+    def __init__(self, file_name, max_bytes=0, backup_count=0, buffer_size=-1, level=logging.NOTSET):
+        self.file_name = file_name
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.buffer_size = buffer_size
+        super(RotatingFileWriter, self).__init__(self._open(), level=level)
+        self.size = self.stream.tell()
+
+    def _open(self):
+        return open(self.file_name, 'a', buffering=self.buffer_size, encoding='utf-8')
+
+    def write(self, lines):
+        if not lines:
+            return
+        data = self.terminator.join(lines) + self.terminator
+        if self.max_bytes and self.size and self.size + len(data) > self.max_bytes:
+            self.rotate()
+        self.stream.write(data)
+        self.size += len(data)
+
+    def rotate(self):
+        self.stream.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                source = '{}.{}'.format(self.file_name, i)
+                if os.path.exists(source):
+                    os.replace(source, '{}.{}'.format(self.file_name, i + 1))
+            os.replace(self.file_name, '{}.1'.format(self.file_name))
+        else:
+            os.remove(self.file_name)
+        self.stream = self._open()
+        self.size = 0
+
+    def close(self):
+        self.stream.close()
+
+
+class GameFilesRouter(object):
+    """ Routes records of games to per-game log files: 'game_<idx>.log' in log_dir. Files are opened lazily,
+    the least recently used files are closed to keep at most max_open_files open. When the game finishes,
+    its file is compressed to 'game_<idx>.log.gz', late records of the game are appended to the compressed file
+    as separate gzip members, so the compressed file is never left incomplete.
+    Files of finished games are compressed and appended by the worker thread, so the listener keeps draining
+    the queue meanwhile.
+    """
+    terminator = '\n'
+
+    def __init__(self, log_dir, max_open_files, level=logging.NOTSET):
+        self.log_dir = log_dir
+        self.max_open_files = max_open_files
+        self.level = level
+        self._files = OrderedDict()  # Game's index to open file, the least recently used file goes first.
+        self._compressing = set()  # Indexes of finished games which files are not compressed yet.
+        self._lock = Lock()
+        self._worker = None  # The only writer of files of finished games, tasks are done in order.
+
+    def file_name(self, game_idx):
+        return os.path.join(self.log_dir, 'game_{}.log'.format(game_idx))
+
+    def _open(self, game_idx):
+        file = self._files.get(game_idx)
+        if file is not None:
+            self._files.move_to_end(game_idx)
+            return file
+        while len(self._files) >= self.max_open_files:
+            self._files.popitem(last=False)[1].close()
+        self._files[game_idx] = file = open(self.file_name(game_idx), 'a', encoding='utf-8')
+        return file
+
+    def route(self, batch):
+        """ Writes records of the batch to files of their games, records without game are skipped.
+        """
+        games_lines = OrderedDict()
+        for levelno, game_idx, line in batch:
+            if game_idx is None:
+                continue
+            if line is None:
+                self._write(game_idx, games_lines.pop(game_idx, []))
+                self.finish_game(game_idx)
+            elif levelno >= self.level:
+                games_lines.setdefault(game_idx, []).append(line)
+        for game_idx, lines in games_lines.items():
+            self._write(game_idx, lines)
+
+    def _write(self, game_idx, lines):
+        if not lines:
+            return
+        text = self.terminator.join(lines) + self.terminator
+        if game_idx not in self._files and self._is_finished(game_idx):
+            self._submit(self._append_compressed, game_idx, text)
+        else:
+            self._open(game_idx).write(text)
+
+    def _is_finished(self, game_idx):
+        with self._lock:
+            if game_idx in self._compressing:
+                return True
+        return os.path.exists(self.file_name(game_idx) + '.gz')
+
+    def _submit(self, fn, *args):
+        if self._worker is None:
+            # The worker is started lazily, in the listener's process:
+            self._worker = ThreadPoolExecutor(max_workers=1)
+        self._worker.submit(fn, *args).add_done_callback(self._report_error)
+
+    @staticmethod
+    def _report_error(future):
+        if future.exception() is not None:
+            sys.stderr.write('Failed to write file of the finished game: {!r}\n'.format(future.exception()))
+
+    def finish_game(self, game_idx):
+        """ Closes the game's file, the file is compressed by the worker.
+        """
+        file = self._files.pop(game_idx, None)
+        if file is not None:
+            file.close()
+        if os.path.exists(self.file_name(game_idx)):
+            with self._lock:
+                self._compressing.add(game_idx)
+            self._submit(self._compress, game_idx)
+
+    def _compress(self, game_idx):
+        file_name = self.file_name(game_idx)
+        try:
+            with open(file_name, 'rb') as src, gzip.open(file_name + '.gz', 'ab') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(file_name)
+        finally:
+            with self._lock:
+                self._compressing.discard(game_idx)
+
+    def _append_compressed(self, game_idx, text):
+        with gzip.open(self.file_name(game_idx) + '.gz', 'at', encoding='utf-8') as file:
+            file.write(text)
+
+    def flush(self):
+        for file in self._files.values():
+            file.flush()
+
+    def close(self):
+        """ Closes open files, waits for the worker to finish files of finished games.
+        """
+        while self._files:
+            self._files.popitem()[1].close()
+        if self._worker is not None:
+            self._worker.shutdown(wait=True)
+            self._worker = None
+
 
 class QueueListener(object):
-    """ This class implements a listener with internal process which watches for LogRecords being added to a queue,
-    removes them and passes them to a list of handlers for processing.
+    """ This class implements a listener with internal process which watches for batches of formatted records
+    being added to a queue, removes them and passes them to a list of writers and to the router of games' records.
+    Writers are flushed every CONFIG.LOG_FLUSH_INTERVAL seconds.
     """
     _sentinel = None
 
-    def __init__(self, queue, *handlers):
-        """ Initialise an instance with the specified queue and handlers.
+    def __init__(self, queue, *writers, games_router=None):
+        """ Initialise an instance with the specified queue, writers and router of games' records.
         """
         self.queue = queue
-        self.handlers = handlers
+        self.writers = writers
+        self.games_router = games_router
         self._stop = Event()
         self._process = None
 
     def dequeue(self, block, timeout=None):
-        """ Dequeue a record and return it, optionally blocking. The base implementation uses get.
+        """ Dequeue a batch and return it, optionally blocking. The base implementation uses get.
         You may want to override this method if you want to use timeouts or work with custom queue implementations.
         """
         return self.queue.get(block, timeout=timeout)
 
     def start(self):
-        """ Start the listener. This starts up a background process to monitor the queue for LogRecords to handle.
+        """ Start the listener. This starts up a background process to monitor the queue for records to handle.
         """
         self._process = p = Process(target=self._monitor)
         p.daemon = True
         p.start()
 
-    def prepare(self, record):
-        """ Prepare a record for handling. This method just returns the passed-in record. You may want to
-        override this method if you need to do any custom marshalling or manipulation of the record before
-        passing it to the handlers.
+    def handle(self, batch):
+        """ Handle a batch of records. This just loops through the writers offering them records of their levels,
+        then routes records of games.
         """
-        return record
+        for writer in self.writers:
+            writer.write([line for levelno, _, line in batch if line is not None and levelno >= writer.level])
+        if self.games_router is not None:
+            self.games_router.route(batch)
 
-    def handle(self, record):
-        """ Handle a record. This just loops through the handlers offering them the record to handle.
-        """
-        record = self.prepare(record)
-        for handler in self.handlers:
-            if record.levelno >= handler.level:
-                handler.handle(record)
+    def flush(self):
+        for writer in self.writers:
+            writer.flush()
+        if self.games_router is not None:
+            self.games_router.flush()
 
     def _monitor(self):
-        """ Monitor the queue for records, and ask the handler to deal with them. This method runs on a separate,
+        """ Monitor the queue for records, and ask the writers to deal with them. This method runs on a separate,
         internal process. The process will terminate if it sees a sentinel object in the queue.
         """
-        q = self.queue
-        has_task_done = hasattr(q, 'task_done')
+        flushed_at = time.monotonic()
         try:
             while not self._stop.is_set():
                 try:
-                    record = self.dequeue(True)
-                    if record is self._sentinel:
+                    batch = self.dequeue(True, CONFIG.LOG_FLUSH_INTERVAL)
+                    if batch is self._sentinel:
                         break
-                    self.handle(record)
-                    if has_task_done:
-                        q.task_done()
+                    self.handle(batch)
                 except Empty:
                     pass
+                if time.monotonic() - flushed_at >= CONFIG.LOG_FLUSH_INTERVAL:
+                    self.flush()
+                    flushed_at = time.monotonic()
         except KeyboardInterrupt:
             pass
         # There might still be records in the queue.
         while True:
             try:
-                record = self.dequeue(True, 1)
-                if record is self._sentinel:
+                batch = self.dequeue(True, 1)
+                if batch is self._sentinel:
                     break
-                self.handle(record)
-                if has_task_done:
-                    q.task_done()
+                self.handle(batch)
             except Empty:
                 break
+        for writer in self.writers:
+            writer.close()
+        if self.games_router is not None:
+            self.games_router.close()
 
     def stop(self):
         """ Stop the listener. This asks the process to terminate, and then waits for it to do so.
@@ -150,7 +458,7 @@ class QueueListener(object):
         on the queue, which won't be processed.
         """
         self._stop.set()
-        self.queue.put_nowait(self._sentinel)
+        self.queue.put(self._sentinel)
         self._process.join()
         self._process = None
 
@@ -165,6 +473,11 @@ class QueuedLogger(DefaultLogger):
         self.queue_listener = queue_listener
         self.is_started = False
 
+    def setLevel(self, level):
+        super(QueuedLogger, self).setLevel(level)
+        # The logger is not registered in logging's manager, so the manager doesn't clear its cache of enabled levels:
+        getattr(self, '_cache', {}).clear()
+
     def start(self):
         if not self.is_started:
             self.debug('Starting logger name={0}'.format(self.name))
@@ -174,11 +487,23 @@ class QueuedLogger(DefaultLogger):
     def stop(self):
         if self.is_started:
             self.debug('Stopping logger name={0}'.format(self.name))
+            for handler in self.handlers:
+                handler.flush()
             self.queue_listener.stop()
             self.is_started = False
 
+    def finish_game(self, game_idx):
+        """ Marks the end of the game's records, the listener closes and compresses the game's log file.
+        """
+        for handler in self.handlers:
+            if isinstance(handler, QueueHandler):
+                handler.finish_game(game_idx)
 
-def get_logger(name=None, level=logging.INFO, queued=False, log_file=None, use_stream=True, use_file=False):
+
+def get_logger(
+        name=None, level=logging.INFO, queued=False, log_file=None, use_stream=True, use_file=False,
+        use_games_files=False
+):
     """ Return logger by its name or create logger if it doesn't exist.
 
     name: logger's name to get/create
@@ -188,6 +513,7 @@ def get_logger(name=None, level=logging.INFO, queued=False, log_file=None, use_s
     log_file: file name to log to
     use_stream: set True in order to use StreamHandler
     use_file: set True in order to use FileHandler
+    use_games_files: set True in order to route records of games to per-game files (queued logger only)
     """
     if name in LOGGERS:
         return LOGGERS[name]
@@ -196,26 +522,28 @@ def get_logger(name=None, level=logging.INFO, queued=False, log_file=None, use_s
         os.makedirs(CONFIG.LOG_DIR)
 
     formatter = logging.Formatter('%(asctime)s [%(levelname)-8s] %(message)s')
-
-    logger_handlers = []
-
-    if use_stream:
-        # Carriage return ('\r') is needed when terminal is in raw/cbreak mode
-        logging.StreamHandler.terminator = '\r\n'
-        stream_handler = logging.StreamHandler()
-        stream_handler.setFormatter(formatter)
-        logger_handlers.append(stream_handler)
-
-    if use_file:
-        log_file_name = log_file or name or CONFIG.DEFAULT_LOG_FILE_NAME
-        file_handler = logging.FileHandler(os.path.join(CONFIG.LOG_DIR, '{}.log'.format(log_file_name)))
-        file_handler.setFormatter(formatter)
-        logger_handlers.append(file_handler)
+    log_file_name = os.path.join(CONFIG.LOG_DIR, '{}.log'.format(log_file or name or CONFIG.DEFAULT_LOG_FILE_NAME))
 
     if queued:
-        queue = Queue(-1)
+        # Records are formatted by the queue handler, the listener's writers get ready strings:
+        logger_writers = []
+        if use_stream:
+            logger_writers.append(StreamWriter())
+        if use_file:
+            logger_writers.append(RotatingFileWriter(
+                log_file_name, max_bytes=CONFIG.LOG_FILE_MAX_BYTES, backup_count=CONFIG.LOG_FILE_BACKUP_COUNT,
+                buffer_size=CONFIG.LOG_BUFFER_SIZE,
+            ))
+        # The queue is bounded, so stalled logging process can't exhaust server's memory:
+        queue = Queue(CONFIG.LOG_QUEUE_SIZE)
         queue_handler = QueueHandler(queue)
-        queue_listener = QueueListener(queue, *logger_handlers)
+        queue_handler.setFormatter(formatter)
+        games_router = None
+        if use_games_files:
+            if not os.path.exists(CONFIG.LOG_GAMES_DIR):
+                os.makedirs(CONFIG.LOG_GAMES_DIR)
+            games_router = GameFilesRouter(CONFIG.LOG_GAMES_DIR, CONFIG.LOG_GAMES_MAX_OPEN_FILES)
+        queue_listener = QueueListener(queue, *logger_writers, games_router=games_router)
         logger = QueuedLogger(name, queue_listener)
         logger.setLevel(level)
         logger.addHandler(queue_handler)
@@ -224,8 +552,16 @@ def get_logger(name=None, level=logging.INFO, queued=False, log_file=None, use_s
         logger = logging.getLogger(name)
         logger.is_queued = False
         logger.setLevel(level)
-        for handler in logger_handlers:
-            logger.addHandler(handler)
+        if use_stream:
+            # Carriage return ('\r') is needed when terminal is in raw/cbreak mode
+            logging.StreamHandler.terminator = '\r\n'
+            stream_handler = logging.StreamHandler()
+            stream_handler.setFormatter(formatter)
+            logger.addHandler(stream_handler)
+        if use_file:
+            file_handler = logging.FileHandler(log_file_name)
+            file_handler.setFormatter(formatter)
+            logger.addHandler(file_handler)
 
     if name is None:
         logging.basicConfig(level=level, handlers=logger.handlers)
@@ -234,4 +570,4 @@ def get_logger(name=None, level=logging.INFO, queued=False, log_file=None, use_s
     return logger
 
 
-log = get_logger('tcpserver', queued=True)
+log = get_logger('tcpserver', queued=True, use_file=CONFIG.LOG_TO_FILE, use_games_files=CONFIG.LOG_GAMES_TO_FILES)
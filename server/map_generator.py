@@ -0,0 +1,179 @@
+""" Generator of synthetic maps for scale testing: grid, random planar and hub-spoke maps.
+"""
+import math
+import random
+
+from entity.post import PostType
+
+STEP = 20  # Distance between neighbour points on the map's picture.
+MARGIN = 10
+
+TOWN = {'population': 1, 'product': 200, 'armor': 100}
+MARKET = {'product': 500, 'replenishment': 10}
+STORAGE = {'armor': 20, 'replenishment': 5}
+
+
+def grid_edges(cols, count):
+    """ Returns edges between horizontal and vertical neighbours of 'count' points placed row by row in 'cols' columns.
+    Points are numbered from 0.
+    """
+    edges = []
+    for i in range(count):
+        if (i + 1) % cols and i + 1 < count:
+            edges.append((i, i + 1))
+        if i + cols < count:
+            edges.append((i, i + cols))
+    return edges
+
+
+def grid(points):
+    """ Returns coordinates and edges of the rectangular grid, a point is connected with its 4 neighbours.
+    Towns can be placed at any point.
+    """
+    cols = math.ceil(math.sqrt(points))
+    coordinates = [(MARGIN + (i % cols) * STEP, MARGIN + (i // cols) * STEP) for i in range(points)]
+    return coordinates, grid_edges(cols, points), list(range(points))
+
+
+def planar(points, rng):
+    """ Returns coordinates and edges of the random planar graph: points are jittered inside cells of the grid,
+    each cell gets a random diagonal, then random edges are removed while the graph stays connected.
+    Jitter is less than a quarter of the step, so cells stay convex and edges never cross.
+    """
+    cols = math.ceil(math.sqrt(points))
+    jitter = STEP // 4 - 1
+    coordinates = [
+        (MARGIN + jitter + (i % cols) * STEP + rng.randint(-jitter, jitter),
+         MARGIN + jitter + (i // cols) * STEP + rng.randint(-jitter, jitter))
+        for i in range(points)
+    ]
+    edges = grid_edges(cols, points)
+    for i in range(points):
+        if (i + 1) % cols and i + cols + 1 < points:
+            edges.append((i, i + cols + 1) if rng.random() < 0.5 else (i + 1, i + cols))
+    rng.shuffle(edges)
+
+    # Spanning tree keeps the graph connected, a half of other edges is removed:
+    parents = list(range(points))
+
+    def root(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    tree, others = [], []
+    for p0, p1 in edges:
+        r0, r1 = root(p0), root(p1)
+        if r0 != r1:
+            parents[r0] = r1
+            tree.append((p0, p1))
+        else:
+            others.append((p0, p1))
+    return coordinates, sorted(tree + others[:len(others) // 2]), list(range(points))
+
+
+def hub(points, hubs, spokes):
+    """ Returns coordinates and edges of the hub-spoke graph: hubs are connected in a ring, the rest of points form
+    'spokes' chains going out of each hub away from the ring's center. Town points are hubs.
+    """
+    if points < hubs:
+        raise ValueError('Number of points is less than number of hubs: {} < {}'.format(points, hubs))
+    if spokes < 1:
+        raise ValueError('Number of spokes of each hub must be at least 1: {}'.format(spokes))
+    chains = hubs * spokes
+    chain_length = (points - hubs) // chains
+    radius = max(STEP * chains / (2 * math.pi), STEP)  # Ends of neighbour spokes are at least STEP apart.
+    size = radius + (chain_length + 1) * STEP
+
+    def position(angle, distance):
+        return distance * math.cos(angle), distance * math.sin(angle)
+
+    coordinates, edges = [], []
+    for i in range(hubs):
+        coordinates.append(position(2 * math.pi * i / hubs, radius))
+        if hubs > 1 and (i + 1 < hubs or hubs > 2):
+            edges.append((i, (i + 1) % hubs))
+    for chain in range(chains):
+        h = chain % hubs
+        angle = 2 * math.pi * (h + (chain // hubs + 0.5) / spokes - 0.5) / hubs
+        previous = h
+        for step in range(1, chain_length + (chain < (points - hubs) % chains) + 1):
+            coordinates.append(position(angle, radius + step * STEP))
+            edges.append((previous, len(coordinates) - 1))
+            previous = len(coordinates) - 1
+    coordinates = [(MARGIN + int(round(x + size)), MARGIN + int(round(y + size))) for x, y in coordinates]
+    return coordinates, edges, list(range(hubs))
+
+
+def generate_map(name, kind='grid', points=100, towns=4, markets=4, storages=4, min_length=1, max_length=3,
+                 spokes=4, seed=None):
+    """ Returns the synthetic map in the format of map files.
+    kind: 'grid', 'planar' or 'hub' (towns are the hubs)
+    points: number of points
+    towns, markets, storages: number of posts of each type
+    min_length, max_length: range of random lengths of lines
+    spokes: number of spokes of each hub for 'hub' maps
+    seed: seed of the random generator, maps generated with the same seed are the same
+    """
+    if towns + markets + storages > points:
+        raise ValueError('Number of posts is greater than number of points: {} > {}'.format(
+            towns + markets + storages, points))
+    if not 1 <= min_length <= max_length:
+        raise ValueError('Wrong range of lines lengths: [{}, {}]'.format(min_length, max_length))
+
+    rng = random.Random(seed)
+    if kind == 'grid':
+        coordinates, edges, town_points = grid(points)
+    elif kind == 'planar':
+        coordinates, edges, town_points = planar(points, rng)
+    elif kind == 'hub':
+        coordinates, edges, town_points = hub(points, max(towns, 1), spokes)
+    else:
+        raise ValueError('Unknown kind of map: \'{}\', available: grid, planar, hub'.format(kind))
+
+    towns_points = rng.sample(town_points, towns)
+    towns_points_set = set(towns_points)
+    posts_points = rng.sample([i for i in range(points) if i not in towns_points_set], markets + storages)
+    posts = (
+        [dict(point=p + 1, name='town-{:02}'.format(i + 1), type=PostType.TOWN.value, **TOWN)
+         for i, p in enumerate(towns_points)] +
+        [dict(point=p + 1, name='market-{:02}'.format(i + 1), type=PostType.MARKET.value, **MARKET)
+         for i, p in enumerate(posts_points[:markets])] +
+        [dict(point=p + 1, name='storage-{:02}'.format(i + 1), type=PostType.STORAGE.value, **STORAGE)
+         for i, p in enumerate(posts_points[markets:])]
+    )
+    return {
+        'name': name,
+        'size': [max(x for x, _ in coordinates) + MARGIN, max(y for _, y in coordinates) + MARGIN],
+        'points': [list(c) for c in coordinates],
+        'posts': posts,
+        'lines': [[rng.randint(min_length, max_length), p0 + 1, p1 + 1] for p0, p1 in edges],
+    }
+
+
+def dump_map(m):
+    """ Returns text of the map file, formatted as hand-written maps.
+    """
+    post_fields = ('population', 'product', 'armor', 'replenishment')
+    lines = [
+        'name: \'{}\''.format(m['name']),
+        'size: [{}, {}]  # [size_x, size_y]'.format(*m['size']),
+        '',
+        'points:',
+    ]
+    lines.extend('  - [{}, {}]  # {}'.format(x, y, i) for i, (x, y) in enumerate(m['points'], 1))
+    lines.extend(['', 'posts:'])
+    for post in m['posts']:
+        lines.extend([
+            '  - point: {}'.format(post['point']),
+            '    name: \'{}\''.format(post['name']),
+            '    type: {}  # {}'.format(post['type'], PostType(post['type']).name),
+        ])
+        lines.extend('    {}: {}'.format(field, post[field]) for field in post_fields if field in post)
+    lines.extend(['', 'lines:'])
+    lines.extend(
+        '  - [{}, {}, {}]  # {}: {}-{}'.format(length, p0, p1, i, p0, p1)
+        for i, (length, p0, p1) in enumerate(m['lines'], 1)
+    )
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,222 @@
+""" Memory accounting of games and observers, detection of games leaked after deletion.
+"""
+import gc
+import sys
+import time
+import tracemalloc
+import weakref
+from collections import Counter, deque
+from threading import Lock, RLock, Thread
+
+from config import CONFIG
+from logger import log
+
+CONTAINERS = (dict, list, tuple, set, frozenset, deque)
+
+
+def is_entity(obj):
+    """ Returns True if the object is an instance of the class defined in 'entity' package.
+    """
+    return 'entity' in type(obj).__module__.split('.')[:-1]
+
+
+def deep_sizeof(obj, exclude=()):
+    """ Returns approximate size of the object in bytes: sizes of the object, its containers and entities
+    reachable from it. Other objects (locks, threads, functions, etc.) are counted but not followed.
+    exclude: objects which are not counted (e.g. shared map topology)
+    """
+    seen = {id(o) for o in exclude}
+    size = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, CONTAINERS):
+            stack.extend(o)
+        elif o is obj or is_entity(o):
+            stack.extend(getattr(o, '__dict__', {}).values())
+    return size
+
+
+def map_topology(game_map):
+    """ Returns parts of the map shared between all games on the map.
+    """
+    return [getattr(game_map, attr, None) for attr in ('lines', 'points', 'coordinates', 'adjacency')]
+
+
+def game_report(game):
+    """ Returns entity counts and approximate size in bytes of the live game.
+    """
+    return {
+        'idx': game.game_idx,
+        'name': game.name,
+        'state': game.state,
+        'current_tick': game.current_tick,
+        'players': len(game.players),
+        'trains': len(game.trains),
+        'posts': len(game.map.posts),
+        'events': sum(
+            len(getattr(e, 'events', ())) for e in list(game.trains.values()) + list(game.map.posts.values())
+        ),
+        'spectators': len(game.spectators),
+        'bytes': deep_sizeof(game, exclude=map_topology(game.map)),
+    }
+
+
+def observer_report(observer):
+    """ Returns entity counts and approximate size in bytes of the observer. The live game watched by the observer
+    is accounted by the game.
+    """
+    live = observer.spectator is not None
+    exclude = [observer.game] if live else map_topology(observer.game.map) if observer.game is not None else []
+    return {
+        'game_idx': observer.game_idx,
+        'game_name': observer.game_name,
+        'live': live,
+        'current_turn': observer.current_turn,
+        'actions': len(observer.actions),
+        'trains': 0 if observer.game is None else len(observer.game.trains),
+        'bytes': deep_sizeof(observer, exclude=exclude),
+    }
+
+
+def describe_referrers(obj, exclude=()):
+    """ Returns types of objects referring to the object, owners of instance dictionaries are named instead of dicts.
+    Frames and objects from 'exclude' (containers of the caller) are skipped.
+    """
+    names = Counter()
+    for referrer in gc.get_referrers(obj):
+        if any(referrer is o for o in exclude):
+            continue
+        if isinstance(referrer, dict):
+            owners = [o for o in gc.get_referrers(referrer) if getattr(o, '__dict__', None) is referrer]
+            if owners:
+                names.update(type(o).__name__ for o in owners)
+            else:
+                names['dict'] += 1
+        elif type(referrer).__name__ != 'frame':
+            names[type(referrer).__name__] += 1
+    return dict(names)
+
+
+class Tracer(object):
+    """ Process-wide tracing of memory allocations (tracemalloc), reports top allocations and their growth
+    since the previous report.
+    """
+
+    def __init__(self, top=CONFIG.MEMORY_TRACING_TOP):
+        self.top = top
+        self._snapshot = None
+        self._lock = Lock()
+
+    @property
+    def is_tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self):
+        tracemalloc.stop()
+        self._snapshot = None
+
+    def report(self):
+        """ Returns traced memory, top allocations by source line and the growth since the previous report.
+        """
+        if not tracemalloc.is_tracing():
+            return None
+        with self._lock:
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+            ))
+            previous_snapshot, self._snapshot = self._snapshot, snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        report = {
+            'traced_bytes': current,
+            'peak_bytes': peak,
+            'top': [
+                {'line': str(stat.traceback), 'bytes': stat.size, 'count': stat.count}
+                for stat in snapshot.statistics('lineno')[:self.top]
+            ],
+            'growth': [],
+        }
+        if previous_snapshot is not None:
+            report['growth'] = [
+                {'line': str(stat.traceback), 'bytes': stat.size_diff, 'count': stat.count_diff}
+                for stat in snapshot.compare_to(previous_snapshot, 'lineno')[:self.top]
+            ]
+        return report
+
+
+class LeakDetector(object):
+    """ Tracks deleted games by weak references. The game which is still alive CONFIG.MEMORY_LEAK_GRACE_PERIOD
+    seconds after deletion is leaked: something still refers to it.
+    """
+
+    def __init__(self, grace_period=CONFIG.MEMORY_LEAK_GRACE_PERIOD):
+        self.grace_period = grace_period
+        self._deleted = {}  # Id of the deleted game to its weak reference and time of deletion.
+        self._reported = set()  # Ids of leaked games which have been logged.
+        self._lock = RLock()  # Weak reference's callback can be called by garbage collector under the lock.
+
+    def track(self, game, now=None):
+        """ Starts tracking of the deleted game.
+        """
+        key = id(game)
+        with self._lock:
+            if key not in self._deleted:
+                ref = weakref.ref(game, lambda _: self._forget(key))
+                self._deleted[key] = (ref, time.monotonic() if now is None else now)
+
+    def _forget(self, key):
+        with self._lock:
+            self._deleted.pop(key, None)
+            self._reported.discard(key)
+
+    def leaked(self, now=None):
+        """ Returns deleted games which are still alive after grace period.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            refs = [ref for ref, deleted_at in self._deleted.values() if now - deleted_at >= self.grace_period]
+        return [game for game in (ref() for ref in refs) if game is not None]
+
+    def check(self, now=None):
+        """ Collects garbage and logs newly leaked games with types of objects referring to them.
+        Returns leaked games.
+        """
+        gc.collect()
+        leaked = self.leaked(now=now)
+        for game in leaked:
+            if id(game) not in self._reported:
+                self._reported.add(id(game))
+                log.warning(
+                    'Game is still alive after deletion, referrers: %s', describe_referrers(game, exclude=(leaked,)),
+                    game=game
+                )
+        return leaked
+
+    def __len__(self):
+        return len(self._deleted)
+
+
+TRACER = Tracer()
+LEAK_DETECTOR = LeakDetector()
+
+
+def start_leak_checker(interval=CONFIG.MEMORY_LEAK_CHECK_INTERVAL):
+    """ Checks deleted games for leaks every 'interval' seconds from own thread.
+    """
+    def check_periodically():
+        while True:
+            time.sleep(interval)
+            LEAK_DETECTOR.check()
+
+    Thread(target=check_periodically, name='leak-checker', daemon=True).start()
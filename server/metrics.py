@@ -0,0 +1,180 @@
+""" Server metrics exposed in Prometheus text format.
+"""
+import bisect
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import Lock, Thread
+
+from config import CONFIG
+from logger import log
+
+# Latency buckets, in seconds:
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def format_labels(names, values, **extra):
+    labels = ['{}="{}"'.format(name, value) for name, value in zip(names, values)]
+    labels.extend('{}="{}"'.format(name, value) for name, value in extra.items())
+    return '{{{}}}'.format(','.join(labels)) if labels else ''
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(ABC):
+    """ Base metric: a family of values identified by values of labels.
+    """
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}  # Tuple of label values to value of the metric.
+        self._lock = Lock()
+
+    @abstractmethod
+    def samples(self):
+        """ Yields samples of the metric: (name, labels string, value).
+        """
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.documentation), '# TYPE {} {}'.format(self.name, self.type)]
+        lines.extend('{}{} {}'.format(name, labels, format_value(value)) for name, labels, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """ Monotonically increasing counter.
+    """
+    type = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def get(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield self.name, format_labels(self.labels, label_values), value
+
+
+class Gauge(Metric):
+    """ Value evaluated by the function on scrape. The function of gauge with labels returns dictionary:
+    tuple of label values to value.
+    """
+    type = 'gauge'
+
+    def __init__(self, name, documentation, func, labels=()):
+        super(Gauge, self).__init__(name, documentation, labels=labels)
+        self.func = func
+
+    def samples(self):
+        values = self.func()
+        if not self.labels:
+            values = {(): values}
+        for label_values, value in sorted(values.items()):
+            yield self.name, format_labels(self.labels, label_values), value
+
+
+class Histogram(Metric):
+    """ Counts observed values in buckets with fixed upper bounds, tracks sum and count of observed values.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labels=labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *label_values):
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(label_values)
+            if values is None:
+                # Counts of values in each bucket (the last one is '+Inf' bucket) and sum of values:
+                self._values[label_values] = values = [[0] * (len(self.buckets) + 1), 0]
+            values[0][bucket] += 1
+            values[1] += value
+
+    def count(self, *label_values):
+        values = self._values.get(label_values)
+        return 0 if values is None else sum(values[0])
+
+    def samples(self):
+        with self._lock:
+            values = sorted(
+                (label_values, (list(counts), total)) for label_values, (counts, total) in self._values.items()
+            )
+        for label_values, (counts, total) in values:
+            cumulative_count = 0
+            for upper_bound, count in zip(self.buckets + ('+Inf', ), counts):
+                cumulative_count += count
+                yield self.name + '_bucket', format_labels(self.labels, label_values, le=upper_bound), cumulative_count
+            yield self.name + '_sum', format_labels(self.labels, label_values), total
+            yield self.name + '_count', format_labels(self.labels, label_values), cumulative_count
+
+
+class Registry(object):
+    """ Collection of metrics rendered together.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """ Returns all metrics in Prometheus text format.
+        """
+        return ''.join(metric.render() + '\n' for metric in self.metrics)
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    'wgforge_requests_total', 'Number of handled requests by action and result.', labels=('action', 'result')
+))
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    'wgforge_request_duration_seconds', 'Time from receiving of the request to sending of the response.',
+    labels=('action', )
+))
+TICK_DURATION = REGISTRY.register(Histogram('wgforge_tick_duration_seconds', 'Duration of game ticks.'))
+TICK_DRIFT = REGISTRY.register(Histogram(
+    'wgforge_tick_drift_seconds', 'Delay of timed game ticks relative to TICK_TIME after the previous tick.'
+))
+TICK_OVERRUNS = REGISTRY.register(Counter(
+    'wgforge_tick_overruns_total', 'Number of game ticks which took longer than MAX_TICK_CALCULATION_TIME.'
+))
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # Scrapes are not logged.
+
+
+def start_metrics_server(address=CONFIG.METRICS_ADDR, port=CONFIG.METRICS_PORT):
+    """ Serves metrics on 'http://<address>:<port>/metrics' from own thread. Returns the HTTP server.
+    """
+    server = HTTPServer((address, port), MetricsRequestHandler)
+    Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    log.info('Serving metrics on %s', server.socket.getsockname())
+    return server
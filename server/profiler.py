@@ -0,0 +1,193 @@
+""" Profiling of the server: durations of game tick phases, overruns of ticks, sampling of threads' stacks.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from datetime import datetime
+from threading import Lock, Thread
+
+import errors
+from config import CONFIG
+from logger import log
+
+
+def percentile(sorted_values, percent):
+    """ Returns percentile of sorted values (nearest-rank method).
+    """
+    rank = max(int(round(percent / 100 * len(sorted_values))), 1)
+    return sorted_values[rank - 1]
+
+
+class TickProfile(object):
+    """ Durations of tick phases, keeps last max_samples durations of each phase.
+    Durations added to the profile are also added to the parent profile (e.g. profile of the game's map).
+    """
+
+    def __init__(self, parent=None, max_samples=CONFIG.TICK_PROFILE_MAX_SAMPLES):
+        self.parent = parent
+        self.max_samples = max_samples
+        self._durations = OrderedDict()  # Phase name to durations, in seconds.
+        self._lock = Lock()
+
+    def add(self, phase, duration):
+        with self._lock:
+            durations = self._durations.get(phase)
+            if durations is None:
+                self._durations[phase] = durations = deque(maxlen=self.max_samples)
+            durations.append(duration)
+        if self.parent is not None:
+            self.parent.add(phase, duration)
+
+    def __bool__(self):
+        return bool(self._durations)
+
+    def to_dict(self):
+        """ Returns statistics of each phase: number of samples and percentiles of durations in milliseconds.
+        """
+        with self._lock:
+            phases = [(phase, sorted(durations)) for phase, durations in self._durations.items()]
+        stats = OrderedDict()
+        for phase, durations in phases:
+            stats[phase] = OrderedDict((
+                ('count', len(durations)),
+                ('p50_ms', round(percentile(durations, 50) * 1000, 3)),
+                ('p90_ms', round(percentile(durations, 90) * 1000, 3)),
+                ('p99_ms', round(percentile(durations, 99) * 1000, 3)),
+                ('max_ms', round(durations[-1] * 1000, 3)),
+            ))
+        return stats
+
+
+MAP_TICK_PROFILES = {}  # Map's name to tick profile aggregated by all games on the map.
+_map_tick_profiles_lock = Lock()
+
+
+def get_map_tick_profile(map_name):
+    """ Returns tick profile of the map, creates the profile if it doesn't exist.
+    """
+    with _map_tick_profiles_lock:
+        profile = MAP_TICK_PROFILES.get(map_name)
+        if profile is None:
+            MAP_TICK_PROFILES[map_name] = profile = TickProfile()
+        return profile
+
+
+class TickWatchdog(object):
+    """ Tracks ticks of all games of the process which were done in the last 'window' seconds,
+    the process is overloaded if the share of ticks overrunning CONFIG.MAX_TICK_CALCULATION_TIME reaches shed_ratio.
+    """
+
+    def __init__(self, window=CONFIG.TICK_OVERRUN_WINDOW, shed_ratio=CONFIG.TICK_OVERRUN_SHED_RATIO):
+        self.window = window
+        self.shed_ratio = shed_ratio
+        self._ticks = deque()  # Time of the tick and the flag of overrun, the oldest tick goes first.
+        self._overruns = 0  # Number of overrun ticks in the window.
+        self._lock = Lock()
+
+    def _expire(self, now):
+        while self._ticks and self._ticks[0][0] <= now - self.window:
+            self._overruns -= self._ticks.popleft()[1]
+
+    def add(self, overrun, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._expire(now)
+            self._ticks.append((now, overrun))
+            self._overruns += overrun
+
+    def is_overloaded(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._expire(now)
+            return bool(self._ticks) and self._overruns / len(self._ticks) >= self.shed_ratio
+
+
+TICK_WATCHDOG = TickWatchdog()
+
+
+THREAD_TAGS = {}  # Thread's identifier to the tag, stacks of tagged threads are rooted at the tag.
+
+
+def tag_thread(tag):
+    """ Tags the current thread (e.g. 'game', 'request') for the sampling profiler.
+    """
+    THREAD_TAGS[threading.get_ident()] = tag
+
+
+def untag_thread():
+    THREAD_TAGS.pop(threading.get_ident(), None)
+
+
+class SamplingProfiler(Thread):
+    """ Samples stacks of all threads 'rate' times per second during 'duration' seconds, writes collapsed stacks
+    to the file: one 'root;frame;...;frame count' line per stack, ready for flame graph tools.
+    Stacks are rooted at the thread's tag or the thread's name for untagged threads.
+    """
+
+    def __init__(self, file_name, duration, rate):
+        super(SamplingProfiler, self).__init__(name='sampling-profiler', daemon=True)
+        self.file_name = file_name
+        self.duration = duration
+        self.rate = rate
+        self.samples = 0
+        self.stacks = Counter()
+        self._labels = {}  # Code object to frame's label.
+
+    def frame_label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = '{}:{}'.format(os.path.basename(code.co_filename), code.co_name)
+            self._labels[code] = label
+        return label
+
+    def sample(self):
+        """ Takes stacks of all threads except the profiler's own thread.
+        """
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == self.ident:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self.frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(THREAD_TAGS.get(ident) or names.get(ident, 'thread').replace(';', '_'))
+            self.stacks[';'.join(reversed(stack))] += 1
+        self.samples += 1
+
+    def run(self):
+        interval = 1 / self.rate
+        sample_at = time.monotonic()
+        finish_at = sample_at + self.duration
+        while sample_at < finish_at:
+            self.sample()
+            sample_at += interval
+            time.sleep(max(sample_at - time.monotonic(), 0))
+        self.dump()
+
+    def dump(self):
+        with open(self.file_name, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write('{} {}\n'.format(stack, count))
+        log.info('Sampling profiler finished, samples: %s, stacks: %s, file: %s',
+                 self.samples, len(self.stacks), self.file_name)
+
+
+SAMPLING_PROFILER = None  # Running or the last run sampling profiler.
+_sampling_profiler_lock = Lock()
+
+
+def start_sampling_profiler(duration=CONFIG.PROFILER_DURATION, rate=CONFIG.PROFILER_RATE):
+    """ Starts sampling profiler writing to LOG_DIR, only one profiler can run at a time. Returns the profiler.
+    """
+    global SAMPLING_PROFILER
+    with _sampling_profiler_lock:
+        if SAMPLING_PROFILER is not None and SAMPLING_PROFILER.is_alive():
+            raise errors.BadCommand('The profiler is already running')
+        file_name = os.path.join(CONFIG.LOG_DIR, 'profile_{:%Y%m%d_%H%M%S_%f}.folded'.format(datetime.now()))
+        SAMPLING_PROFILER = SamplingProfiler(file_name, duration, rate)
+        SAMPLING_PROFILER.start()
+        log.info('Sampling profiler started, duration: %ss, rate: %s/s', duration, rate)
+        return SAMPLING_PROFILER
@@ -2,19 +2,26 @@
 """
 import json
 import socket
+import time
 from functools import wraps
+from threading import Lock
 from socketserver import ThreadingTCPServer, BaseRequestHandler
 
 from invoke import task
 
 import errors
+import memory
+import metrics
+import profiler
 from config import CONFIG
 from db import game_db
+from db.session import request_session_ctx
 from defs import Action, Result
 from entity.game import Game, GameState
 from entity.observer import Observer
 from entity.player import Player
 from entity.serializable import Serializable
+from entity.spectator import encode_response
 from logger import log
 
 
@@ -41,13 +48,16 @@ class GameServerRequestHandler(BaseRequestHandler):
         self.game = None
         self.game_idx = None
         self.observer = None
+        self.request_started_at = None
         self.closed = None
+        self.write_lock = Lock()  # Responses and frames of live games are written from different threads.
         super(GameServerRequestHandler, self).__init__(*args, **kwargs)
 
     def setup(self):
-        log.info('New connection from {}'.format(self.client_address), game=self.game)
+        log.info('New connection from %s', self.client_address, game=self.game)
         self.closed = False
         self.HANDLERS[id(self)] = self
+        profiler.tag_thread('request')
 
     def handle(self):
         while not self.closed:
@@ -63,12 +73,21 @@ class GameServerRequestHandler(BaseRequestHandler):
             handler.request.shutdown(socket.SHUT_RDWR)
 
     def finish(self):
-        log.warn('Connection from {} lost'.format(self.client_address), game=self.game)
+        log.warn('Connection from %s lost', self.client_address, game=self.game)
+        if self.observer is not None:
+            self.observer.close()
         if self.game is not None and self.player is not None and self.player.in_game:
             self.game.remove_player(self.player)
             if not self.observer:
                 game_db.add_action(self.game_idx, Action.LOGOUT, player_idx=self.player.idx)
         self.HANDLERS.pop(id(self))
+        profiler.untag_thread()
+
+    @property
+    def is_admin(self):
+        """ Admin commands are available for connections from admin addresses only.
+        """
+        return self.client_address[0] in CONFIG.ADMIN_ADDRS
 
     def data_received(self, data):
         if self.data:
@@ -76,25 +95,35 @@ class GameServerRequestHandler(BaseRequestHandler):
             self.data = None
 
         if self.parse_data(data):
-            log.info('[REQUEST] Player: {}, action: {!r}, message:\n{}'.format(
+            self.request_started_at = time.perf_counter()
+            log.info(
+                '[REQUEST] Player: %s, action: %r, message:\n%s',
                 self.player.idx if self.player is not None else self.client_address,
-                Action(self.action), self.message), game=self.game)
+                self.action, self.message, game=self.game
+            )
 
             try:
                 data = json.loads(self.message)
                 if not isinstance(data, dict):
                     raise errors.BadCommand('The command\'s payload is not a dictionary')
                 if self.observer:
-                    self.write_response(*self.observer.action(self.action, data))
+                    # Observer's commands replay games, DB helpers called by the replay use own short transactions,
+                    # so no transaction is kept open while turns are simulated:
+                    result, message = self.observer.action(self.action, data)
                 else:
-                    if self.action not in self.ACTION_MAP or self.action in CONFIG.HIDDEN_COMMANDS:
+                    if self.action not in self.ACTION_MAP or self.action in CONFIG.HIDDEN_COMMANDS or (
+                            self.action in CONFIG.ADMIN_COMMANDS and not self.is_admin):
                         raise errors.BadCommand('No such action: {}'.format(self.action))
-                    method = self.ACTION_MAP[self.action]
-                    result, message = method(self, data)
-                    self.write_response(result, message)
+                    # All DB helpers called by the command share one transaction, committed before the response:
+                    with request_session_ctx():
+                        method = self.ACTION_MAP[self.action]
+                        result, message = method(self, data)
 
-                    if not self.observer and self.action in self.REPLAY_ACTIONS:
-                        game_db.add_action(self.game_idx, self.action, message=data, player_idx=self.player.idx)
+                        if not self.observer and self.action in self.REPLAY_ACTIONS:
+                            game_db.add_action(
+                                self.game_idx, self.action, message=data, player_idx=self.player.idx
+                            )
+                self.write_response(result, message)
 
             # Handle errors:
             except (json.decoder.JSONDecodeError, errors.BadCommand) as err:
@@ -107,6 +136,10 @@ class GameServerRequestHandler(BaseRequestHandler):
                 self.error_response(Result.TIMEOUT, err)
             except errors.ResourceNotFound as err:
                 self.error_response(Result.RESOURCE_NOT_FOUND, err)
+            except errors.ReplayDivergence as err:
+                self.error_response(Result.INTERNAL_SERVER_ERROR, err)
+            except errors.ServerOverloaded as err:
+                self.error_response(Result.ACCESS_DENIED, err)
             except Exception:
                 log.exception('Got unhandled exception on client command execution', game=self.game)
                 self.error_response(Result.INTERNAL_SERVER_ERROR)
@@ -147,12 +180,18 @@ class GameServerRequestHandler(BaseRequestHandler):
 
     def write_response(self, result, message=None):
         resp_message = '' if message is None else message
-        log.debug('[RESPONSE] Player: {}, result: {!r}, message:\n{}'.format(
+        log.debug(
+            '[RESPONSE] Player: %s, result: %r, message:\n%s',
             self.player.idx if self.player is not None else self.client_address,
-            result, resp_message), game=self.game)
-        self.request.sendall(result.to_bytes(CONFIG.RESULT_HEADER, byteorder='little'))
-        self.request.sendall(len(resp_message).to_bytes(CONFIG.MSGLEN_HEADER, byteorder='little'))
-        self.request.sendall(resp_message.encode('utf-8'))
+            result, resp_message, game=self.game
+        )
+        self.send_packet(encode_response(result, resp_message))
+        metrics.REQUESTS.inc(self.action.name, result.name)
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - self.request_started_at, self.action.name)
+
+    def send_packet(self, packet):
+        with self.write_lock:
+            self.request.sendall(packet)
 
     def error_response(self, result, exception=None):
         if exception is not None:
@@ -199,14 +238,14 @@ class GameServerRequestHandler(BaseRequestHandler):
         self.game_idx = game.game_idx
         self.player = player
 
-        log.info('Player successfully logged in: {}'.format(player), game=self.game)
+        log.info('Player successfully logged in: %s', player, game=self.game)
         message = self.player.to_json_str()
 
         return Result.OKEY, message
 
     @login_required
     def on_logout(self, _):
-        log.info('Logout player: {}'.format(self.player.name), game=self.game)
+        log.info('Logout player: %s', self.player.name, game=self.game)
         self.game.remove_player(self.player)
         self.closed = True
         return Result.OKEY, None
@@ -253,14 +292,58 @@ class GameServerRequestHandler(BaseRequestHandler):
         )
         return Result.OKEY, games.to_json_str()
 
-    def on_observer(self, _):
+    def on_observer(self, data: dict):
         if self.game or self.observer:
             raise errors.BadCommand('Impossible to connect as observer')
         else:
-            self.observer = Observer()
-            message = self.observer.games_to_json_str()
+            observer = Observer(send=self.send_packet)
+            message = observer.games_to_json_str(data)  # Validates the filter and the cursor.
+            self.observer = observer
             return Result.OKEY, message
 
+    def on_tick_profile(self, data: dict):
+        if 'enabled' in data:
+            Game.profile_ticks = bool(data['enabled'])
+        profile = Serializable()
+        profile.set_attributes(
+            enabled=Game.profile_ticks,
+            games={game.name: game.tick_profile.to_dict() for game in list(Game.GAMES.values())},
+            maps={name: map_profile.to_dict() for name, map_profile in list(profiler.MAP_TICK_PROFILES.items())},
+        )
+        return Result.OKEY, profile.to_json_str()
+
+    def on_profile(self, data: dict):
+        duration = data.get('duration', CONFIG.PROFILER_DURATION)
+        rate = data.get('rate', CONFIG.PROFILER_RATE)
+        if not isinstance(duration, (int, float)) or not 0 < duration <= CONFIG.PROFILER_MAX_DURATION:
+            raise errors.BadCommand('Duration must be in range (0, {}]'.format(CONFIG.PROFILER_MAX_DURATION))
+        if not isinstance(rate, (int, float)) or not 0 < rate <= CONFIG.PROFILER_MAX_RATE:
+            raise errors.BadCommand('Rate must be in range (0, {}]'.format(CONFIG.PROFILER_MAX_RATE))
+        sampling_profiler = profiler.start_sampling_profiler(duration=duration, rate=rate)
+        message = Serializable()
+        message.set_attributes(file=sampling_profiler.file_name, duration=duration, rate=rate)
+        return Result.OKEY, message.to_json_str()
+
+    def on_memory(self, data: dict):
+        if data.get('tracing') is True:
+            memory.TRACER.start()
+        elif data.get('tracing') is False:
+            memory.TRACER.stop()
+        report = Serializable()
+        report.set_attributes(
+            games=[memory.game_report(game) for game in list(Game.GAMES.values())],
+            observers=[
+                memory.observer_report(handler.observer)
+                for handler in list(self.HANDLERS.values()) if handler.observer is not None
+            ],
+            leaked_games=[
+                {'idx': game.game_idx, 'name': game.name, 'referrers': memory.describe_referrers(game)}
+                for game in memory.LEAK_DETECTOR.leaked()
+            ],
+            tracemalloc=memory.TRACER.report(),
+        )
+        return Result.OKEY, report.to_json_str()
+
     ACTION_MAP = {
         Action.LOGIN: on_login,
         Action.LOGOUT: on_logout,
@@ -271,6 +354,9 @@ class GameServerRequestHandler(BaseRequestHandler):
         Action.PLAYER: on_player,
         Action.GAMES: on_list_games,
         Action.OBSERVER: on_observer,
+        Action.TICK_PROFILE: on_tick_profile,
+        Action.PROFILE: on_profile,
+        Action.MEMORY: on_memory,
     }
     REPLAY_ACTIONS = {
         Action.LOGIN,
@@ -280,6 +366,32 @@ class GameServerRequestHandler(BaseRequestHandler):
     }
 
 
+metrics.REGISTRY.register(metrics.Gauge(
+    'wgforge_connections', 'Number of open connections.', lambda: len(GameServerRequestHandler.HANDLERS)
+))
+metrics.REGISTRY.register(metrics.Gauge(
+    'wgforge_active_games', 'Number of not finished games.',
+    lambda: sum(1 for game in list(Game.GAMES.values()) if not game.is_finished)
+))
+metrics.REGISTRY.register(metrics.Gauge(
+    'wgforge_game_last_tick_duration_seconds', 'Duration of the last tick of each running game.',
+    lambda: {
+        (game.game_idx, ): game.tick_duration
+        for game in list(Game.GAMES.values()) if game.tick_duration is not None and not game.is_finished
+    },
+    labels=('game_idx', )
+))
+metrics.REGISTRY.register(metrics.Gauge(
+    'wgforge_leaked_games', 'Number of deleted games which are still alive after grace period.',
+    lambda: len(memory.LEAK_DETECTOR.leaked())
+))
+metrics.REGISTRY.register(metrics.Gauge(
+    'wgforge_game_tick_overruns', 'Number of overrun ticks of each running game.',
+    lambda: {(game.game_idx, ): game.tick_overruns for game in list(Game.GAMES.values()) if not game.is_finished},
+    labels=('game_idx', )
+))
+
+
 @task
 def run_server(_, address=CONFIG.SERVER_ADDR, port=CONFIG.SERVER_PORT, log_level='INFO'):
     """ Launches 'WG Forge' TCP server.
@@ -287,7 +399,10 @@ def run_server(_, address=CONFIG.SERVER_ADDR, port=CONFIG.SERVER_PORT, log_level
     log.setLevel(log_level)
     ThreadingTCPServer.allow_reuse_address = True
     server = ThreadingTCPServer((address, port), GameServerRequestHandler)
-    log.info('Serving on {}'.format(server.socket.getsockname()))
+    log.info('Serving on %s', server.socket.getsockname())
+    if CONFIG.METRICS_ENABLED:
+        metrics.start_metrics_server()
+    memory.start_leak_checker()
     try:
         server.serve_forever()
     except KeyboardInterrupt:
@@ -4,6 +4,7 @@ from os import getenv, path
 
 from attrdict import AttrDict
 
+from defs import Action
 from entity.event import EventType
 
 
@@ -20,6 +21,36 @@ class BaseConfig(object):
 
     LOG_DIR = path.join(SRC_DIR, 'logs')
     DEFAULT_LOG_FILE_NAME = 'logs'
+    LOG_TO_FILE = False
+    LOG_BATCH_SIZE = 256  # Records are sent to the logging process in batches.
+    LOG_FLUSH_INTERVAL = 0.5  # Seconds, incomplete batches and buffered writers are flushed with this interval.
+    LOG_BUFFER_SIZE = 1024 * 1024
+    LOG_FILE_MAX_BYTES = 100 * 1024 * 1024  # Log file is rotated when it reaches this size.
+    LOG_FILE_BACKUP_COUNT = 5
+    LOG_QUEUE_SIZE = 64  # Maximum number of batches in the queue to the logging process.
+    LOG_MAX_PENDING_BATCHES = 4  # Records pending while the queue is full are limited by this number of batches.
+    # When the queue is full only each N-th record of the level is kept (0 - all are dropped), other levels are kept:
+    LOG_DROP_POLICY = {'DEBUG': 0, 'INFO': 10}
+    LOG_DROP_SUMMARY_INTERVAL = 10  # Seconds, the number of dropped records is logged with this interval.
+    LOG_GAMES_TO_FILES = False  # Records of each game are also written to own file, compressed when the game finishes.
+    LOG_GAMES_DIR = path.join(LOG_DIR, 'games')
+    LOG_GAMES_MAX_OPEN_FILES = 64
+
+    TICK_PROFILING = False  # Measure durations of tick phases, can be switched by admin command TICK_PROFILE.
+    TICK_PROFILE_MAX_SAMPLES = 10000  # Durations of the last ticks kept for each phase.
+
+    PROFILER_DURATION = 30  # Seconds, default duration of sampling profiler's run.
+    PROFILER_MAX_DURATION = 600
+    PROFILER_RATE = 50  # Samples per second.
+    PROFILER_MAX_RATE = 1000
+
+    MEMORY_TRACING_TOP = 10  # Number of top allocations in memory reports.
+    MEMORY_LEAK_CHECK_INTERVAL = 60  # Seconds, deleted games are checked for leaks with this interval.
+    MEMORY_LEAK_GRACE_PERIOD = 60  # Seconds, the game which is alive longer after deletion is leaked.
+
+    METRICS_ENABLED = True
+    METRICS_ADDR = getenv('METRICS_ADDR', '127.0.0.1')
+    METRICS_PORT = int(getenv('METRICS_PORT', 2001))
 
     ACTION_HEADER = 4
     RESULT_HEADER = 4
@@ -27,17 +58,27 @@ class BaseConfig(object):
     RECEIVE_CHUNK_SIZE = 1024
 
     HIDDEN_COMMANDS = {}
+    # Admin commands, available only for connections from ADMIN_ADDRS (no addresses by default):
+    ADMIN_COMMANDS = {Action.TICK_PROFILE, Action.PROFILE, Action.MEMORY}
+    ADMIN_ADDRS = set()
     HIDDEN_MAP_LAYERS = {}
     TRAIN_HIDDEN_FIELDS = {}
     POST_HIDDEN_FIELDS = {}
 
     TICK_TIME = 10
-    MAX_TICK_CALCULATION_TIME = 3
+    MAX_TICK_CALCULATION_TIME = 3  # Ticks which take longer are logged and counted as overruns.
+    TICK_OVERRUN_WINDOW = 60  # Seconds, overruns of ticks of all games are tracked in this window.
+    TICK_OVERRUN_SHED_LOAD = False  # Refuse new games when ticks are overrunning.
+    TICK_OVERRUN_SHED_RATIO = 0.1  # Share of overrun ticks in the window when new games are refused.
     TURN_TIMEOUT = TICK_TIME + MAX_TICK_CALCULATION_TIME
 
     MAP_NAME = 'map04'
     MAPS_FORMAT = 'yaml'
     MAPS_DISCOVERY = path.join(SRC_DIR, 'maps/*.yaml')
+    MAP_IMPORT_BATCH_SIZE = 1000
+    MAPS_SYNTHETIC_DIR = path.join(SRC_DIR, 'maps_synthetic')  # Maps generated by 'generate-synthetic-map'.
+    MAP_CACHE_ON_DISK = False
+    MAP_CACHE_DIR = path.join(SRC_DIR, 'maps_cache')
 
     DEFAULT_NUM_PLAYERS = 1
     DEFAULT_NUM_TURNS = -1
@@ -65,6 +106,14 @@ class BaseConfig(object):
     }
 
     MAX_EVENT_MESSAGES = 5
+    OBSERVER_GAMES_MAX_LIMIT = 1000
+    OBSERVER_KEYFRAME_INTERVAL = 50
+    OBSERVER_ACTIONS_WINDOW = 1000
+    OBSERVER_TIMELINE_MAX_FRAMES = 10000
+    REPLAY_CACHE_SIZE = 256 * 1024 * 1024  # Memory budget of the replay cache shared by observers, in bytes.
+    REPLAY_CACHE_ACTION_SIZE = 512  # Estimated memory footprint of one decoded replay action, in bytes.
+    SPECTATOR_QUEUE_SIZE = 16  # Frames waiting to be sent to a spectator of a live game.
+    SPECTATOR_MAX_SKIPPED_FRAMES = 100  # The spectator is dropped after this number of skipped frames in a row.
     TIME_FORMAT = '%b %d %Y %I:%M:%S.%f'
 
     TOWN_LEVELS = AttrDict({
@@ -1,4 +1,5 @@
 """ WG Forge server tasks.
 """
+from benchmarks import benchmark_logging  # noqa F401
 from db.tasks import *  # noqa F401
 from server import run_server  # noqa F401
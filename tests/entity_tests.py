@@ -2,12 +2,19 @@
 """
 
 import json
+import tempfile
 
 from server.db import map_db
+from server.db.models import Map as MapModel
+from server.db.session import session_ctx
+from server.entity.event import EventType
 from server.entity.map import Map
+from server.entity.map_cache import MapCache
 from server.entity.player import Player
 from server.entity.point import Point
 from server.entity.post import Post, PostType
+from server.entity.replay_cache import ReplayCache
+from server.entity.simulation import Simulation
 from server.entity.train import Train
 from tests.lib.base_test import BaseTest
 
@@ -79,6 +86,116 @@ class TestEntity(BaseTest):
         self.assertIn('size', data)
         self.assertIn('coordinates', data)
 
+    def test_map_cache(self):
+        """ Test compiled maps cache.
+        """
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = MapCache(cache_dir=cache_dir)
+            with session_ctx() as session:
+                map_model = session.query(MapModel).filter(MapModel.name == self.MAP_NAME).one()
+                topology = cache.get(map_model, session)
+                self.assertIs(cache.get(map_model, session), topology)
+
+            compiled_map = topology.compiled_map
+            self.assertEqual(compiled_map.name, self.MAP_NAME)
+            self.assertEqual(len(compiled_map.lines), 18)
+            self.assertEqual(len(compiled_map.points), 12)
+            self.assertEqual(len(compiled_map.posts), 6)
+            self.assertEqual(len(topology.lines), 18)
+            self.assertEqual(len(topology.points), 12)
+            self.assertEqual(sorted(topology.adjacency[1]), [1, 13, 18])
+
+            # Compiled map has been persisted, new cache loads it from disk:
+            self.assertEqual(MapCache(cache_dir=cache_dir).load((map_model.id, map_model.import_id)), compiled_map)
+
+            # DB is re-initialized, the map gets the same id and content hash, but the compiled map is not reused:
+            map_db.reset_db()
+            map_db.generate_maps(map_names=[self.MAP_NAME, ], active_map=self.MAP_NAME)
+            with session_ctx() as session:
+                new_map_model = session.query(MapModel).filter(MapModel.name == self.MAP_NAME).one()
+                self.assertEqual(
+                    (new_map_model.id, new_map_model.content_hash), (map_model.id, map_model.content_hash)
+                )
+                self.assertIsNone(cache.load((new_map_model.id, new_map_model.import_id)))
+                self.assertIsNot(cache.get(new_map_model, session), topology)
+
+    def test_replay_cache(self):
+        """ Test replay cache evicts least recently used values to fit into memory budget.
+        """
+        cache = ReplayCache(max_size=100)
+        cache.put('a', 1, 40)
+        cache.put('b', 2, 40)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3, 40)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.size, 80)
+
+        # Value exceeding the whole budget is not cached:
+        cache.put('d', 4, 101)
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual(len(cache), 2)
+
+        cache.put('a', 5, 10)
+        self.assertEqual(cache.get('a'), 5)
+        self.assertEqual(cache.size, 50)
+
+        # Values of the replay are dropped together:
+        cache.put(((1, 'private'), 'actions', None), 6, 10)
+        cache.put(((1, 'private'), 'keyframe', 10), 7, 10)
+        cache.put((1, 'keyframe', 10), 8, 10)
+        cache.discard((1, 'private'))
+        self.assertEqual((len(cache), cache.size), (3, 60))
+        self.assertEqual(cache.get((1, 'keyframe', 10)), 8)
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+    def test_map_shared_topology(self):
+        """ Test maps of different games share immutable topology and have own posts.
+        """
+        game_map_1 = Map(self.MAP_NAME)
+        game_map_2 = Map(self.MAP_NAME)
+        self.assertEqual(game_map_1.to_json_str(), game_map_2.to_json_str())
+        self.assertIs(game_map_1.lines, game_map_2.lines)
+        self.assertIs(game_map_1.points, game_map_2.points)
+        self.assertIs(game_map_1.coordinates, game_map_2.coordinates)
+        self.assertIsNot(game_map_1.posts, game_map_2.posts)
+        self.assertIsNot(game_map_1.posts[1], game_map_2.posts[1])
+
+    def test_simulation(self):
+        """ Test simulation kernel without game loop and persistence: ticks, moves, events and snapshots.
+        """
+        simulation = Simulation(Map(self.MAP_NAME), random_events=False)
+        player = simulation.add_player(Player('Vasya'))
+        train = list(player.trains.values())[0]
+        line = simulation.map.lines[train.line_idx]
+        speed = 1 if train.position == 0 else -1
+        simulation.move_train(player, train.idx, speed, line.idx)
+        simulation.tick()
+        self.assertEqual(simulation.current_tick, 1)
+        self.assertEqual(train.position, 1 if speed > 0 else line.length - 1)
+
+        snapshot = simulation.snapshot()
+        population = player.town.population
+        simulation.make_refugees_arrival(1)
+        self.assertEqual(player.town.population, min(population + 1, player.town.population_capacity))
+        self.assertNotEqual(simulation.event_cooldowns[EventType.REFUGEES_ARRIVAL], 0)
+        simulation.tick()
+
+        simulation.restore(snapshot)
+        self.assertEqual(simulation.current_tick, 1)
+        self.assertEqual(simulation.players[player.idx].town.population, population)
+
+        # Simulations with the same seed draw the same random numbers, snapshots keep random generator's state:
+        simulation_1, simulation_2 = (Simulation(Map(self.MAP_NAME), seed=42) for _ in range(2))
+        snapshot = simulation_1.snapshot()
+        numbers = [simulation_1.random.randint(1, 100) for _ in range(10)]
+        self.assertEqual([simulation_2.random.randint(1, 100) for _ in range(10)], numbers)
+        simulation_1.restore(snapshot)
+        self.assertEqual([simulation_1.random.randint(1, 100) for _ in range(10)], numbers)
+
     def test_player_init(self):
         """ Test create player entity.
         """
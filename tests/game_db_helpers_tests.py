@@ -9,6 +9,7 @@ from server.db import map_db, game_db
 from server.db.models import Game, Action, Player
 from server.db.session import Session
 from server.defs import Action as ActionCodes
+from server.entity.game import GameState
 from tests.lib.base_test import BaseTest
 
 
@@ -132,6 +133,37 @@ class TestGameDb(BaseTest):
         self.assertEqual(game1.map_id, self.map_id)
         self.assertEqual(game1.num_players, num_players)
         self.assertEqual(len1, length)
+        self.assertEqual(game1.num_ticks, 0)  # The length of the running game is counted from its actions.
+
+        game_db.update_game_state(game_id, GameState.FINISHED)
+        game, game_length = game_db.get_game(game_id)
+        self.assertEqual(game.num_ticks, length)
+        self.assertEqual(game_length, length)
+
+    def test_get_games(self):
+        game_ids = [game_db.add_game('test_game_{}'.format(i), self.map_id) for i in range(3)]
+        for game_id in game_ids:
+            game_db.add_action(game_id, ActionCodes.TURN)
+        game_db.update_game_state(game_ids[0], GameState.FINISHED)
+
+        games = game_db.get_games(limit=2, cursor=game_ids[0], with_data=False)
+        self.assertEqual([(g.id, g.length) for g in games], [(game_ids[1], 1), (game_ids[2], 1)])
+        self.assertNotIn('data', games[0].keys())
+        games = game_db.get_games(limit=1)
+        self.assertEqual([(g.id, g.name, g.length, g.data) for g in games], [(game_ids[0], 'test_game_0', 1, None)])
+
+    def test_update_game_state(self):
+        game_id = game_db.add_game('test_game', self.map_id)
+        game, _ = game_db.get_game(game_id)
+        self.assertEqual(game.state, GameState.INIT)
+
+        game_db.update_game_state(game_id, GameState.RUN)
+        game, _ = game_db.get_game(game_id)
+        self.assertEqual(game.state, GameState.RUN)
+
+        game_db.update_game_state(game_id, GameState.FINISHED)
+        game, _ = game_db.get_game(game_id)
+        self.assertEqual(game.state, GameState.FINISHED)
 
     def test_get_all_actions(self):
         player_idx = str(uuid.uuid4())
@@ -172,6 +204,26 @@ class TestGameDb(BaseTest):
         self.assertEqual(action3.message, message)
         self.assertEqual(action3.player_id, player_idx)
 
+    def test_get_actions(self):
+        game_id_1 = game_db.add_game('test_game1', self.map_id)
+        game_id_2 = game_db.add_game('test_game2', self.map_id)
+        for i in range(7):
+            game_db.add_action(game_id_1, ActionCodes.TURN, {'fake_message': i})
+            game_db.add_action(game_id_2, ActionCodes.TURN, {'fake_message': i})
+
+        actions, after = [], None
+        while True:
+            window = game_db.get_actions(game_id_1, after=after, limit=3)
+            if not window:
+                break
+            self.assertLessEqual(len(window), 3)
+            actions.extend(window)
+            after = (window[-1].created_at, window[-1].id)
+
+        all_actions = game_db.get_all_actions(game_id_1)
+        self.assertEqual([a.id for a in actions], [a.id for a in all_actions])
+        self.assertEqual([a.message for a in actions], [{'fake_message': i} for i in range(7)])
+
     def test_get_all_games_when_game_has_no_actions(self):
         length = 0
         num_players = 1
@@ -2,9 +2,10 @@
 """
 
 from server.config import CONFIG
-from server.db import map_db
+from server.db import game_db, map_db
 from server.entity.event import Event, EventType
 from tests.lib.base_test import BaseTest
+from tests.lib.server_connection import ServerConnection
 
 
 class TestGameEvents(BaseTest):
@@ -156,3 +157,26 @@ class TestGameEvents(BaseTest):
         self.assertEqual(len(train_1['events']), CONFIG.MAX_EVENT_MESSAGES)
         train_1 = self.get_train(train_1['idx'])
         self.assertEqual(len(train_1['events']), 0)
+
+    def test_observer_regenerates_events(self):
+        """ Replay the game with observer, verify random events are regenerated from the game's seed.
+        """
+        town_idx = self.player['town']['idx']
+        self.turn(turns_count=10)
+        town = self.get_post(town_idx)
+
+        observer = ServerConnection()
+        try:
+            games = self.observer(connection=observer)['games']
+            game_idx = next(g['idx'] for g in games if g['name'] == 'Game of {}'.format(self.player_name))
+            self.assertIsNotNone(game_db.get_game(game_idx)[0].seed)
+            self.set_game(game_idx, connection=observer)
+            self.set_turn(self.current_tick, connection=observer)
+            replayed_town = self.get_post(town_idx, connection=observer)
+        finally:
+            observer.close()
+        for key in ('population', 'product', 'armor'):
+            self.assertEqual(replayed_town[key], town[key])
+        self.assertEqual(
+            [e['type'] for e in replayed_town['events']], [e['type'] for e in town['events']]
+        )
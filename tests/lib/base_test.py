@@ -258,6 +258,15 @@ class BaseTest(unittest.TestCase):
         )
         return json.loads(message) if message else None
 
+    def observer_games(self, filters=None, exp_result=Result.OKEY, **kwargs):
+        _, message = self.do_action(
+            Action.GAMES,
+            filters or {},
+            exp_result=exp_result,
+            **kwargs
+        )
+        return json.loads(message) if message else None
+
     def set_turn(self, turn_idx, exp_result=Result.OKEY, **kwargs):
         _, message = self.do_action(
             Action.TURN,
@@ -267,10 +276,25 @@ class BaseTest(unittest.TestCase):
         )
         return json.loads(message) if message else None
 
-    def set_game(self, game_idx, exp_result=Result.OKEY, **kwargs):
+    def set_game(self, game_idx, live=False, exp_result=Result.OKEY, **kwargs):
+        data = {'idx': game_idx}
+        if live:
+            data['live'] = True
         _, message = self.do_action(
             Action.GAME,
-            {'idx': game_idx},
+            data,
+            exp_result=exp_result,
+            **kwargs
+        )
+        return json.loads(message) if message else None
+
+    def get_timeline(self, turn_from, turn_to, stride=None, exp_result=Result.OKEY, **kwargs):
+        data = {'from': turn_from, 'to': turn_to}
+        if stride is not None:
+            data['stride'] = stride
+        _, message = self.do_action(
+            Action.TIMELINE,
+            data,
             exp_result=exp_result,
             **kwargs
         )
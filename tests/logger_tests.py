@@ -0,0 +1,126 @@
+""" Tests for queued logger.
+"""
+import gzip
+import logging
+import os
+import tempfile
+import unittest
+from queue import Queue
+
+from server.config import CONFIG
+from server.logger import GameFilesRouter, QueuedLogger, QueueHandler, RotatingFileWriter
+
+
+class TestLogger(unittest.TestCase):
+
+    def test_rotating_file_writer(self):
+        """ Write batches of records to the file, verify the file is rotated on size limit.
+        """
+        with tempfile.TemporaryDirectory() as log_dir:
+            file_name = os.path.join(log_dir, 'test.log')
+            writer = RotatingFileWriter(file_name, max_bytes=100, backup_count=2)
+            for i in range(10):
+                writer.write(['record {} {}'.format(i, 'x' * 20), 'second line'])
+            writer.close()
+
+            self.assertEqual(sorted(os.listdir(log_dir)), ['test.log', 'test.log.1', 'test.log.2'])
+            for name in os.listdir(log_dir):
+                self.assertLessEqual(os.path.getsize(os.path.join(log_dir, name)), 100)
+            with open(file_name) as f:
+                self.assertEqual(f.read().splitlines()[-2:], ['record 9 {}'.format('x' * 20), 'second line'])
+
+    def test_queued_logger_level(self):
+        """ Change level of the queued logger after the level was checked, verify the new level is applied.
+        """
+        logger = QueuedLogger('test', queue_listener=None)
+        logger.setLevel(logging.WARNING)
+        self.assertFalse(logger.isEnabledFor(logging.INFO))
+        logger.setLevel(logging.INFO)
+        self.assertTrue(logger.isEnabledFor(logging.INFO))
+
+    def test_queue_handler_drop_policy(self):
+        """ Emit records while the queue is full, verify DEBUG records are dropped, INFO records are sampled,
+        ERROR records are kept and the number of dropped records is reported.
+        """
+        handler = QueueHandler(Queue(maxsize=1), drop_policy={'DEBUG': 0, 'INFO': 2})
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        handler.queue.put_nowait([])  # The queue is full.
+        for level, count in ((logging.DEBUG, 4), (logging.INFO, 4), (logging.ERROR, 2)):
+            for i in range(count):
+                handler.emit(logging.LogRecord('test', level, __file__, 0, '{} {}'.format(level, i), None, None))
+        handler.flush()
+        handler.flush()  # Retained records are not shed again.
+        self.assertEqual(handler.dropped, {'DEBUG': 4, 'INFO': 2})
+
+        handler.queue.get_nowait()
+        handler.flush()
+        self.assertEqual(
+            [line for _, _, line in handler.queue.get_nowait()],
+            ['20 1', '20 3', '40 0', '40 1', 'Log queue is full, dropped records: DEBUG=4, INFO=2']
+        )
+
+    def test_queue_handler_max_pending(self):
+        """ Emit records while the listener is stalled (the queue is full), verify the pending batch stops growing,
+        the oldest records are dropped and the number of dropped records is reported.
+        """
+        handler = QueueHandler(Queue(maxsize=1), drop_policy={}, max_pending=CONFIG.LOG_BATCH_SIZE)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        handler.queue.put_nowait([])  # The queue is full.
+        for i in range(CONFIG.LOG_BATCH_SIZE * 3):
+            handler.emit(logging.LogRecord('test', logging.WARNING, __file__, 0, str(i), None, None))
+            self.assertLessEqual(len(handler._batch), CONFIG.LOG_BATCH_SIZE)
+        self.assertEqual(handler.dropped, {'WARNING': CONFIG.LOG_BATCH_SIZE * 2})
+
+        handler.flush()  # The summary is added to the full batch, so the oldest record is dropped.
+        self.assertEqual(len(handler._batch), CONFIG.LOG_BATCH_SIZE)
+        handler.queue.get_nowait()
+        handler.flush()
+        lines = [line for _, _, line in handler.queue.get_nowait()]
+        self.assertEqual(lines[0], str(CONFIG.LOG_BATCH_SIZE * 2 + 1))
+        self.assertEqual(lines[-3:], [
+            str(CONFIG.LOG_BATCH_SIZE * 3 - 1),
+            'Log queue is full, dropped records: WARNING={}'.format(CONFIG.LOG_BATCH_SIZE * 2),
+            'Log queue is full, dropped records: WARNING=1',
+        ])
+
+    def test_queue_handler_max_pending_errors(self):
+        """ Overflow the pending batch mostly with ERROR records while the queue is full, verify records of lower
+        levels are dropped first and ERROR records are never dropped.
+        """
+        handler = QueueHandler(Queue(maxsize=1), drop_policy={}, max_pending=4)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        handler.queue.put_nowait([])  # The queue is full.
+        records = [(logging.ERROR, 'error 0'), (logging.WARNING, 'warning'), (logging.INFO, 'info')]
+        records += [(logging.ERROR, 'error {}'.format(i)) for i in range(1, 8)]
+        for level, message in records:
+            handler.emit(logging.LogRecord('test', level, __file__, 0, message, None, None))
+        with handler.lock:
+            handler.send()
+        self.assertEqual(handler.dropped, {'INFO': 1, 'WARNING': 1})
+        self.assertEqual(
+            [line for _, _, line in handler._batch],
+            ['error {}'.format(i) for i in range(8)]
+        )
+
+    def test_game_files_router(self):
+        """ Route records of two games with one open file at most, finish one game,
+        verify records are in files of their games and the file of the finished game is compressed.
+        """
+        with tempfile.TemporaryDirectory() as log_dir:
+            router = GameFilesRouter(log_dir, max_open_files=1)
+            router.route([
+                (logging.INFO, 1, 'game 1 record 1'),
+                (logging.INFO, None, 'server record'),
+                (logging.INFO, 2, 'game 2 record 1'),
+                (logging.INFO, 1, 'game 1 record 2'),
+                (logging.NOTSET, 1, None),  # The game 1 is finished.
+                (logging.INFO, 2, 'game 2 record 2'),
+                (logging.INFO, 1, 'game 1 late record'),
+            ])
+            router.close()
+
+            self.assertEqual(sorted(os.listdir(log_dir)), ['game_1.log.gz', 'game_2.log'])
+            with gzip.open(os.path.join(log_dir, 'game_1.log.gz'), 'rt') as f:
+                self.assertEqual(f.read().splitlines(), ['game 1 record 1', 'game 1 record 2', 'game 1 late record'])
+            with open(os.path.join(log_dir, 'game_2.log')) as f:
+                self.assertEqual(f.read().splitlines(), ['game 2 record 1', 'game 2 record 2'])
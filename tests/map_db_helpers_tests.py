@@ -0,0 +1,102 @@
+""" Test DB helpers for map actions.
+"""
+import os
+from tempfile import TemporaryDirectory
+
+from server import map_generator
+from server.db import map_db
+from server.db.models import Map, Line, Point, Post
+from server.db.session import Session
+from tests.lib.base_test import BaseTest
+
+
+class TestMapDb(BaseTest):
+
+    MAP_NAME = 'test01'
+
+    def setUp(self):
+        super().setUp()
+        map_db.truncate_tables()
+        self.session = Session()
+
+    def tearDown(self):
+        map_db.truncate_tables()
+        self.session.close()
+        super().tearDown()
+
+    def test_generate_map(self):
+        map_db.generate_maps(map_names=[self.MAP_NAME, ], active_map=self.MAP_NAME)
+
+        game_map = self.session.query(Map).filter(Map.name == self.MAP_NAME).one()
+        self.assertTrue(game_map.active)
+        self.assertIsNotNone(game_map.content_hash)
+        self.assertEqual(game_map.points.count(), 12)
+        self.assertEqual(game_map.posts.count(), 6)
+        self.assertEqual(game_map.lines.count(), 18)
+
+        points = game_map.points.order_by(Point.id).all()
+        self.assertEqual((points[0].x, points[0].y), (75, 16))
+        lines = game_map.lines.order_by(Line.id).all()
+        self.assertEqual((lines[0].p0, lines[0].p1), (points[0].id, points[6].id))
+        posts = game_map.posts.order_by(Post.id).all()
+        self.assertEqual(posts[0].name, 'town-one')
+        self.assertEqual(posts[0].point_id, points[0].id)
+        self.assertEqual(posts[2].replenishment, 2)
+        self.assertEqual(posts[2].population, 0)
+
+    def test_generate_unchanged_map(self):
+        map_db.generate_maps(map_names=[self.MAP_NAME, ])
+        map_id = map_db.get_map_by_name(self.MAP_NAME).id
+
+        map_db.generate_maps(map_names=[self.MAP_NAME, ])
+        self.assertEqual(map_db.get_map_by_name(self.MAP_NAME).id, map_id)
+
+        map_db.generate_maps(map_names=[self.MAP_NAME, ], force=True)
+        game_map = map_db.get_map_by_name(self.MAP_NAME)
+        self.assertNotEqual(game_map.id, map_id)
+        self.assertEqual(self.session.query(Map).count(), 1)
+        self.assertEqual(self.session.query(Point).count(), 12)
+        self.assertEqual(self.session.query(Line).filter(Line.map_id == game_map.id).count(), 18)
+
+    def test_generate_synthetic_map(self):
+        """ Generate maps of each kind, verify they are connected and imported from map files.
+        """
+        for kind in ('grid', 'planar', 'hub'):
+            m = map_generator.generate_map(
+                kind, kind=kind, points=150, towns=5, markets=3, storages=2, min_length=2, max_length=4, seed=1
+            )
+            self.assertEqual(m, map_generator.generate_map(
+                kind, kind=kind, points=150, towns=5, markets=3, storages=2, min_length=2, max_length=4, seed=1
+            ))
+            self.assertEqual(len(m['points']), 150)
+            self.assertEqual(len({tuple(point) for point in m['points']}), 150)
+            self.assertEqual(len({post['point'] for post in m['posts']}), 10)
+            self.assertTrue(all(2 <= length <= 4 for length, _, _ in m['lines']))
+
+            neighbours = {point: set() for point in range(1, 151)}
+            for _, p0, p1 in m['lines']:
+                neighbours[p0].add(p1)
+                neighbours[p1].add(p0)
+            reached, stack = {1}, [1]
+            while stack:
+                for point in neighbours[stack.pop()] - reached:
+                    reached.add(point)
+                    stack.append(point)
+            self.assertEqual(len(reached), 150)
+
+            with TemporaryDirectory() as dir_name:
+                file_name = os.path.join(dir_name, '{}.yaml'.format(kind))
+                with open(file_name, 'w') as f:
+                    f.write(map_generator.dump_map(m))
+                self.assertTrue(map_db.load_map(file_name))
+                self.assertFalse(map_db.load_map(file_name))
+
+            game_map = self.session.query(Map).filter(Map.name == kind).one()
+            self.assertEqual(game_map.points.count(), 150)
+            self.assertEqual(game_map.posts.count(), 10)
+            self.assertEqual(game_map.lines.count(), len(m['lines']))
+
+        with self.assertRaises(ValueError):
+            map_generator.generate_map('grid', points=10, towns=5, markets=5, storages=1)
+        with self.assertRaises(ValueError):
+            map_generator.generate_map('hub', kind='hub', points=10, towns=2, markets=1, storages=1, spokes=0)
@@ -0,0 +1,98 @@
+""" Tests for admin action 'MEMORY' and detection of leaked games.
+"""
+import json
+
+from server.db import map_db
+from server.defs import Action, Result
+from server.memory import LeakDetector, describe_referrers
+from tests.lib.base_test import BaseTest
+from tests.lib.server_connection import ServerConnection
+
+
+class TestMemory(BaseTest):
+
+    MAP_NAME = 'map04'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        map_db.generate_maps(map_names=[cls.MAP_NAME, ], active_map=cls.MAP_NAME)
+
+    def get_memory_report(self, **kwargs):
+        _, message = self.do_action(Action.MEMORY, kwargs or '', exp_result=Result.OKEY)
+        return json.loads(message)
+
+    def test_memory_report(self):
+        """ Verify memory report of the live game and the observer.
+        """
+        self.login(game=self.game_name)
+        observer = ServerConnection()
+        try:
+            observer.send_action(Action.OBSERVER, '')
+            report = self.get_memory_report()
+        finally:
+            observer.close()
+
+        game_report = [g for g in report['games'] if g['name'] == self.game_name][0]
+        self.assertEqual(game_report['players'], 1)
+        self.assertEqual(game_report['trains'], 8)
+        self.assertGreater(game_report['posts'], 0)
+        self.assertGreater(game_report['bytes'], 0)
+        self.assertGreaterEqual(len(report['observers']), 1)
+        self.assertIsNone(report['tracemalloc'])
+
+    def test_live_game_released(self):
+        """ Attach observer to the live game, delete the game, verify the observer releases the game.
+        """
+        self.login(game=self.game_name)
+        observer = ServerConnection()
+        try:
+            games = self.observer(connection=observer)['games']
+            game_idx = next(g['idx'] for g in games if g['name'] == self.game_name)
+            self.set_game(game_idx, live=True, connection=observer)
+            self.logout()  # The game without players is deleted.
+            self.reset_connection()
+            report = self.get_memory_report()
+        finally:
+            observer.close()
+
+        self.assertNotIn(game_idx, [g['idx'] for g in report['games']])
+        observer_report = [o for o in report['observers'] if o['game_idx'] == game_idx][0]
+        self.assertFalse(observer_report['live'])
+        self.assertEqual(observer_report['trains'], 0)
+
+    def test_memory_tracing(self):
+        """ Switch on tracing of allocations, verify top allocations and their growth are reported.
+        """
+        try:
+            report = self.get_memory_report(tracing=True)
+            self.assertGreater(report['tracemalloc']['traced_bytes'], 0)
+            self.assertTrue(report['tracemalloc']['top'])
+            self.assertEqual(report['tracemalloc']['growth'], [])
+            self.login()
+            report = self.get_memory_report()
+            self.assertTrue(report['tracemalloc']['growth'])
+        finally:
+            self.assertIsNone(self.get_memory_report(tracing=False)['tracemalloc'])
+
+    def test_leak_detector(self):
+        """ Track deleted object, verify it is leaked while it is referred after grace period.
+        """
+        class Deleted(object):
+            pass
+
+        detector = LeakDetector(grace_period=10)
+        holder = [Deleted()]
+        detector.track(holder[0], now=0)
+        self.assertEqual(detector.leaked(now=5), [])
+        self.assertEqual(detector.leaked(now=10), holder)
+        self.assertEqual(detector.check(now=10), holder)
+        self.assertEqual(describe_referrers(holder[0]), {'list': 1})
+        leaked = detector.leaked(now=10)
+        self.assertEqual(describe_referrers(holder[0]), {'list': 2})
+        self.assertEqual(describe_referrers(holder[0], exclude=(leaked,)), {'list': 1})
+        leaked.clear()
+
+        holder.clear()
+        self.assertEqual(detector.leaked(now=10), [])
+        self.assertEqual(len(detector), 0)
@@ -0,0 +1,86 @@
+""" Tests for server metrics.
+"""
+from urllib.request import urlopen
+
+from server.config import CONFIG
+from server.db import map_db
+from server.defs import Result
+from server.metrics import Histogram
+from tests.lib.base_test import BaseTest
+
+
+class TestMetrics(BaseTest):
+
+    MAP_NAME = 'test01'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        map_db.generate_maps(map_names=[cls.MAP_NAME, ], active_map=cls.MAP_NAME)
+
+    @staticmethod
+    def get_metrics():
+        """ Scrapes server's metrics, returns dictionary: sample (name with labels) to value.
+        """
+        with urlopen('http://{}:{}/metrics'.format(CONFIG.METRICS_ADDR, CONFIG.METRICS_PORT)) as response:
+            text = response.read().decode('utf-8')
+        samples = {}
+        for line in text.splitlines():
+            if line and not line.startswith('#'):
+                sample, value = line.rsplit(' ', 1)
+                samples[sample] = float(value)
+        return samples
+
+    def test_histogram(self):
+        """ Observe values, verify cumulative buckets, sum and count of the histogram.
+        """
+        histogram = Histogram('test_seconds', 'Test histogram.', labels=('action', ), buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value, 'MAP')
+
+        self.assertEqual(
+            histogram.render().splitlines(),
+            [
+                '# HELP test_seconds Test histogram.',
+                '# TYPE test_seconds histogram',
+                'test_seconds_bucket{action="MAP",le="0.1"} 2',
+                'test_seconds_bucket{action="MAP",le="1"} 3',
+                'test_seconds_bucket{action="MAP",le="+Inf"} 4',
+                'test_seconds_sum{action="MAP"} 2.65',
+                'test_seconds_count{action="MAP"} 4',
+            ]
+        )
+
+    def test_request_metrics(self):
+        """ Make requests, verify counters and latency histogram by action and result, active games and connections.
+        """
+        before = self.get_metrics()
+        self.login()
+        self.get_map(1)
+        self.get_map(1)
+        self.get_map(5, exp_result=Result.RESOURCE_NOT_FOUND)
+        after = self.get_metrics()
+
+        def delta(sample):
+            return after.get(sample, 0) - before.get(sample, 0)
+
+        self.assertEqual(delta('wgforge_requests_total{action="LOGIN",result="OKEY"}'), 1)
+        self.assertEqual(delta('wgforge_requests_total{action="MAP",result="OKEY"}'), 2)
+        self.assertEqual(delta('wgforge_requests_total{action="MAP",result="RESOURCE_NOT_FOUND"}'), 1)
+        self.assertEqual(delta('wgforge_request_duration_seconds_count{action="MAP"}'), 3)
+        self.assertGreater(delta('wgforge_request_duration_seconds_sum{action="MAP"}'), 0)
+        self.assertGreaterEqual(after['wgforge_connections'], 1)
+        self.assertGreaterEqual(after['wgforge_active_games'], 1)
+
+    def test_tick_metrics(self):
+        """ Make turns, verify tick durations are measured.
+        """
+        before = self.get_metrics()
+        self.login()
+        self.turn(2)
+        after = self.get_metrics()
+
+        self.assertGreaterEqual(
+            after['wgforge_tick_duration_seconds_count'] - before.get('wgforge_tick_duration_seconds_count', 0), 2
+        )
+        self.assertTrue(any(sample.startswith('wgforge_game_last_tick_duration_seconds{') for sample in after))
@@ -1,12 +1,16 @@
 """ Test Observer client-server protocol.
 """
 
+import json
 import time
 
 from server.config import CONFIG
-from server.db import map_db
+from server.db import game_db, map_db
+from server.db.models import Action as ActionModel
 from server.db.session import session_ctx
-from server.db.tasks import generate_replay01
+from server.db.tasks import generate_replay01, verify_replay
+from server.defs import Action, Result
+from server.entity.game import GameState
 from tests.lib.base_test import BaseTest
 from tests.lib.server_connection import ServerConnection
 
@@ -29,6 +33,45 @@ class TestObserver(BaseTest):
         self.assertIn('games', data)
         self.assertNotEqual(len(data['games']), 0)
 
+    def test_observer_games_pagination(self):
+        """ Get list of recorded games page by page, verify filters.
+        """
+        map_idx = map_db.get_map_by_name(self.MAP_NAME).id
+        for i in range(3):
+            game_db.add_game('{}_{}'.format(self.game_name, i), map_idx)
+
+        all_games = self.observer()['games']
+        self.assertGreaterEqual(len(all_games), 4)
+        self.assertIn('data', all_games[0])
+
+        games, cursor = [], None
+        while True:
+            data = self.observer_games({'limit': 2, 'cursor': cursor, 'with_data': False})
+            self.assertLessEqual(len(data['games']), 2)
+            for game in data['games']:
+                self.assertNotIn('data', game)
+            games.extend(data['games'])
+            cursor = data['cursor']
+            if cursor is None:
+                break
+        self.assertEqual([g['idx'] for g in games], [g['idx'] for g in all_games])
+
+        data = self.observer_games({'map_idx': map_idx + 1000})
+        self.assertEqual(data['games'], [])
+        data = self.observer_games({'created_from': all_games[-1]['created_at']})
+        self.assertEqual(data['games'][0]['idx'], all_games[-1]['idx'])
+        data = self.observer_games({'created_to': all_games[0]['created_at']})
+        self.assertEqual(data['games'], [])
+
+        self.observer_games({'limit': 0}, exp_result=Result.BAD_COMMAND)
+        self.observer_games({'created_from': 'yesterday'}, exp_result=Result.BAD_COMMAND)
+
+    def test_observer_bad_filter(self):
+        """ Connect as observer with wrong cursor, verify the connection is not switched to observer mode.
+        """
+        self.do_action(Action.OBSERVER, {'cursor': 'last'}, exp_result=Result.BAD_COMMAND)
+        self.login()
+
     def test_observer_select_game(self):
         """ Select the test game, verify initial state.
         """
@@ -74,6 +117,114 @@ class TestObserver(BaseTest):
         self.assertEqual(train['speed'], 0)
         self.assertEqual(train['position'], 0)
 
+    def test_observer_seek_with_keyframes(self):
+        """ Seek forward and backward over keyframes, verify the same state on the same turn.
+        """
+        turns = (1, CONFIG.OBSERVER_KEYFRAME_INTERVAL - 1, CONFIG.OBSERVER_KEYFRAME_INTERVAL,
+                 CONFIG.OBSERVER_KEYFRAME_INTERVAL + 7, 2 * CONFIG.OBSERVER_KEYFRAME_INTERVAL + 3)
+        self.observer()
+        self.set_game(1)
+        states = {}
+        for turn in turns:
+            self.set_turn(turn)
+            states[turn] = self.get_map(1)
+
+        for turn in reversed(turns):
+            self.set_turn(turn)
+            self.assertEqual(self.get_map(1), states[turn])
+        for turn in (turns[-1], turns[0], turns[-2], turns[-3]):
+            self.set_turn(turn)
+            self.assertEqual(self.get_map(1), states[turn])
+
+    def test_observer_timeline(self):
+        """ Get frames of the range of turns in one request, verify them against states of the turns.
+        """
+        self.observer()
+        self.set_game(1)
+        timeline = self.get_timeline(0, 20, stride=5)
+        self.assertEqual(timeline['turns'], [0, 5, 10, 15, 20])
+        for frame, turn in enumerate(timeline['turns']):
+            self.set_turn(turn)
+            for train in self.get_map(1)['trains']:
+                for field in ('line_idx', 'position', 'speed', 'goods'):
+                    self.assertEqual(timeline['trains'][str(train['idx'])][field][frame], train[field])
+        self.assertIsNone(timeline['trains']['1']['position'][0])
+        for post_idx in self.get_posts():
+            self.assertEqual(len(timeline['posts'][str(post_idx)]['product']), 5)
+
+        self.get_timeline(0, 20, stride=0, exp_result=Result.BAD_COMMAND)
+        self.get_timeline('0', 20, exp_result=Result.BAD_COMMAND)
+
+    def test_observer_live_game(self):
+        """ Attach observer to a running game, verify frames are streamed after game ticks.
+        """
+        player = self.login(game=self.game_name, num_players=1)
+        observer = ServerConnection()
+        try:
+            games = self.observer(connection=observer)['games']
+            game_idx = next(g['idx'] for g in games if g['name'] == self.game_name)
+            self.set_game(game_idx, live=True, connection=observer)
+            tick = 0
+            for _ in range(3):
+                self.turn()
+                result, message = observer.read_response()
+                self.assertEqual(result, Result.FRAME)
+                frame = json.loads(message)
+                self.assertGreater(frame['tick'], tick)
+                tick = frame['tick']
+                self.assertIn(player['idx'], [t['player_idx'] for t in frame['map']['trains']])
+        finally:
+            observer.close()
+        self.logout()
+
+    def test_verify_replay(self):
+        """ Play a game until finish, re-simulate it, verify final ratings match recorded ones.
+        """
+        player = self.login(game=self.game_name, num_players=1, num_turns=3)
+        train = player['trains'][0]
+        self.move_train(train['line_idx'], train['idx'], 1)
+        self.turn(turns_count=3)
+        self.logout()
+
+        game_idx = next(g.id for g in game_db.get_games() if g.name == self.game_name)
+        self.assertIn(game_idx, game_db.get_games_idx(state=GameState.FINISHED))
+        verified_game_idx, divergent_turn, mismatches, turns, _ = verify_replay(game_idx)
+        self.assertEqual(verified_game_idx, game_idx)
+        self.assertIsNone(divergent_turn)
+        self.assertEqual(mismatches, [])
+        self.assertEqual(turns, 3)
+
+        # Corrupt recorded state hash of the second turn, observer has to stop on it:
+        with session_ctx() as session:
+            turn_action = session.query(ActionModel).filter(
+                ActionModel.game_id == game_idx, ActionModel.code == Action.TURN.value
+            ).order_by(ActionModel.created_at, ActionModel.id).offset(1).first()
+            turn_action.message = {'hash': turn_action.message['hash'] + 1}
+        self.reset_connection()
+        self.observer()
+        self.set_game(game_idx)
+        self.set_turn(1)
+        self.set_turn(3, exp_result=Result.INTERNAL_SERVER_ERROR)
+
+        # Play another game, drop its state hashes (as in games recorded before hashes) and make MOVE fail,
+        # replay stops on the error:
+        self.reset_connection()
+        player = self.login(game='{}_legacy'.format(self.game_name), num_players=1, num_turns=1)
+        train = player['trains'][0]
+        self.move_train(train['line_idx'], train['idx'], 1)
+        self.turn()
+        self.logout()
+        game_idx = next(g.id for g in game_db.get_games() if g.name == '{}_legacy'.format(self.game_name))
+        with session_ctx() as session:
+            for action in session.query(ActionModel).filter(ActionModel.game_id == game_idx):
+                if action.code == Action.TURN.value:
+                    action.message = {}
+                elif action.code == Action.MOVE.value:
+                    action.message = dict(action.message, line_idx=-1)
+        _, divergent_turn, mismatches, _, _ = verify_replay(game_idx)
+        self.assertEqual(divergent_turn, 0)
+        self.assertEqual(mismatches, [])
+
     def test_read_coordinates(self):
         """ Get coordinates of points using layer 10.
         """
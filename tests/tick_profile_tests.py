@@ -0,0 +1,83 @@
+""" Tests for admin actions 'TICK_PROFILE', 'PROFILE' and ticks watchdog.
+"""
+import json
+import os
+import time
+
+from server.db import map_db
+from server.defs import Action, Result
+from server.profiler import TickWatchdog
+from tests.lib.base_test import BaseTest
+
+
+class TestTickProfile(BaseTest):
+
+    MAP_NAME = 'test01'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        map_db.generate_maps(map_names=[cls.MAP_NAME, ], active_map=cls.MAP_NAME)
+
+    def get_tick_profile(self, **kwargs):
+        _, message = self.do_action(Action.TICK_PROFILE, kwargs or '', exp_result=Result.OKEY)
+        return json.loads(message)
+
+    def test_tick_profile(self):
+        """ Switch on ticks profiling, make turns, verify durations of tick phases by game and by map.
+        """
+        self.assertTrue(self.get_tick_profile(enabled=True)['enabled'])
+        try:
+            self.login(game=self.game_name)
+            self.turn(3)
+            profile = self.get_tick_profile()
+        finally:
+            self.assertFalse(self.get_tick_profile(enabled=False)['enabled'])
+
+        game_profile = profile['games'][self.game_name]
+        self.assertEqual(len(game_profile), 11)
+        self.assertEqual(game_profile['update_cooldowns_on_tick']['count'], 3)
+        self.assertEqual(game_profile['retire_events_on_tick']['count'], 3)
+        for stats in game_profile.values():
+            self.assertLessEqual(stats['p50_ms'], stats['p90_ms'])
+            self.assertLessEqual(stats['p90_ms'], stats['max_ms'])
+        map_profile = profile['maps'][self.MAP_NAME]
+        self.assertGreaterEqual(map_profile['update_cooldowns_on_tick']['count'], 3)
+
+    def test_tick_watchdog(self):
+        """ Add ticks with overruns, verify the process is overloaded until overrun ticks leave the window.
+        """
+        watchdog = TickWatchdog(window=60, shed_ratio=0.5)
+        self.assertFalse(watchdog.is_overloaded(now=0))
+        for now in range(3):
+            watchdog.add(False, now=now)
+        watchdog.add(True, now=10)
+        self.assertFalse(watchdog.is_overloaded(now=10))
+        watchdog.add(True, now=20)
+        watchdog.add(True, now=30)
+        self.assertTrue(watchdog.is_overloaded(now=30))
+        watchdog.add(False, now=70)  # Ticks done before the 10th second are expired.
+        self.assertTrue(watchdog.is_overloaded(now=70))
+        self.assertFalse(watchdog.is_overloaded(now=91))
+
+    def test_sampling_profiler(self):
+        """ Run sampling profiler, verify collapsed stacks of game and request threads are written to the file.
+        """
+        self.login()
+        self.do_action(Action.PROFILE, {'duration': 0}, exp_result=Result.BAD_COMMAND)
+        _, message = self.do_action(Action.PROFILE, {'duration': 0.5, 'rate': 100}, exp_result=Result.OKEY)
+        file_name = json.loads(message)['file']
+        self.do_action(Action.PROFILE, {'duration': 1}, exp_result=Result.BAD_COMMAND)  # The profiler is running.
+
+        for _ in range(50):
+            if os.path.exists(file_name):
+                break
+            time.sleep(0.1)
+        try:
+            with open(file_name) as f:
+                stacks = [line.rsplit(' ', 1) for line in f.read().splitlines()]
+        finally:
+            os.remove(file_name)
+        self.assertTrue(any(stack.startswith('game;') for stack, _ in stacks))
+        self.assertTrue(any(stack.startswith('request;') and 'data_received' in stack for stack, _ in stacks))
+        self.assertTrue(all(int(count) > 0 for _, count in stacks))